@@ -0,0 +1,64 @@
+"""
+Write and read speed of the page archive (utils/archive.py): synthetic site
+pages are queued into an ArchiveWriter as a crawl would, then read back with
+ArchiveReader.pages() and looked up with get().
+
+usage: python -m benchmarks.bench_archive [--pages N] [--codec zstd|gzip] [--file-bytes N]
+"""
+import os
+import random
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from benchmarks.corpus import CorpusResponse, RawResponse
+from benchmarks.synthetic_site import SyntheticSite
+from utils.archive import ArchiveReader, ArchiveWriter
+
+
+def site_pages(pages):
+    site = SyntheticSite(pages_per_host=max(1, pages // len(SyntheticSite().hosts)))
+    responses = []
+    for host in site.hosts:
+        for path in site.paths[host]:
+            url = f"https://{host}{path}"
+            status, content, _ = site.fetch(url)
+            responses.append(CorpusResponse(url, status, None, RawResponse(url, content)))
+    return responses[:pages]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--codec", choices=["zstd", "gzip"], default="zstd")
+    parser.add_argument("--file-bytes", type=int, default=16 << 20)
+    args = parser.parse_args()
+
+    responses = site_pages(args.pages)
+    raw_bytes = sum(len(resp.raw_response.content or b"") for resp in responses)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        writer = ArchiveWriter(tmp, codec=args.codec, file_bytes=args.file_bytes)
+        for resp in responses:
+            writer.add(resp.url, resp)
+        queued = time.perf_counter() - start
+        writer.close()
+        written = time.perf_counter() - start
+        archive_bytes = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+
+        reader = ArchiveReader(tmp)
+        start = time.perf_counter()
+        read = sum(1 for _ in reader.pages())
+        reading = time.perf_counter() - start
+
+        urls = random.Random(121).sample([resp.url for resp in responses], min(1000, len(responses)))
+        start = time.perf_counter()
+        found = sum(reader.get(url) is not None for url in urls)
+        lookups = time.perf_counter() - start
+
+    print(f"{len(responses)} pages, {raw_bytes / 2 ** 20:.1f} MiB of content, codec {writer.codec}, "
+          f"{len(reader.paths)} files, {archive_bytes / 2 ** 20:.1f} MiB on disk ({raw_bytes / archive_bytes:.1f}x)")
+    print(f"queue    {len(responses) / queued:10.0f} pages/sec (what the workers wait)")
+    print(f"write    {len(responses) / written:10.0f} pages/sec {raw_bytes / 2 ** 20 / written:7.1f} MiB/sec")
+    print(f"pages()  {read / reading:10.0f} pages/sec {raw_bytes / 2 ** 20 / reading:7.1f} MiB/sec")
+    print(f"get()    {len(urls) / lookups:10.0f} lookups/sec, {found} of {len(urls)} found")
@@ -0,0 +1,286 @@
+"""
+Offline crawl benchmark: runs the same crawl launch.py would, against a local
+stub cache server (or an in-process download) serving a synthetic or recorded
+site, and reports pages/sec, p50/p99 latency per stage, the memory high-water
+mark and the frontier size over time. Needs no network.
+
+usage: python -m benchmarks.bench_crawl [--site synthetic|DIR] [--pages-per-host N]
+           [--transport http|inprocess] [--mode threads|async] [--threads N]
+           [--parse-processes N] [--save frontier.shelve|frontier.log|frontier.sqlite]
+           [--scorer lifo|depth|yield] [--max-fetches N] [--page-cache FILE [--recrawl]]
+           [--archive DIR]
+           [--json FILE] [--baseline FILE] [--tolerance 0.2]
+
+With --baseline, exits with status 1 when pages/sec fell more than tolerance
+below the baseline's, so it can gate a CI job.
+"""
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+from configparser import ConfigParser
+from functools import wraps
+from itertools import count
+
+import scraper
+import crawler.worker
+from benchmarks.stub_cache_server import StubCacheServer, make_download
+from benchmarks.synthetic_site import RecordedSite, SyntheticSite
+from crawler import Crawler, get_frontier_factory, get_worker_factory
+from utils.config import Config
+from utils.download import AsyncDownloader
+from utils.metrics import metrics
+from utils.parse_pool import ParsePool
+from utils.robots import RobotsCache, make_robots_fetch
+
+# seconds spent in each stage, appended to from every worker thread
+timings = defaultdict(list)
+
+
+def timed(stage, func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_async(stage, func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+    return wrapper
+
+
+def limit_fetches(frontier, max_fetches):
+    # the frontier looks empty once max_fetches urls were handed out
+    get_tbd_url = frontier.get_tbd_url
+    handed_out = count()
+
+    @wraps(get_tbd_url)
+    def limited():
+        if next(handed_out) >= max_fetches:
+            return None
+        return get_tbd_url()
+    frontier.get_tbd_url = limited
+
+
+def install_timers(frontier):
+    crawler.worker.download = timed("download", crawler.worker.download)
+    AsyncDownloader.download = timed_async("download", AsyncDownloader.download)
+    scraper.analyze_response = timed("parse", scraper.analyze_response)
+    # with parser processes, parse includes sending the page there and back
+    ParsePool.analyze = timed("parse", ParsePool.analyze)
+    ParsePool.analyze_async = timed_async("parse", ParsePool.analyze_async)
+    scraper.record_result = timed("record", scraper.record_result)
+    crawler.worker.Worker.add_links = timed("filter_and_queue_links", crawler.worker.Worker.add_links)
+    frontier.get_tbd_url = timed("frontier_get_incl_wait", frontier.get_tbd_url)
+    frontier.mark_complete_and_add = timed("frontier_complete_and_add", frontier.mark_complete_and_add)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Monitor(threading.Thread):
+    """samples pages crawled, frontier size and memory every interval seconds"""
+    def __init__(self, frontier, interval):
+        super().__init__(daemon=True)
+        self.frontier = frontier
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.start_time = time.perf_counter()
+
+    def sample(self):
+        self.samples.append({
+            "seconds": round(time.perf_counter() - self.start_time, 2),
+            "pages": scraper.crawl_stats.pages,
+            "frontier": self.frontier.pending_count(),
+            "rss_mb": round((rss_bytes() or 0) / 2 ** 20, 1),
+        })
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+
+
+def make_config(args, site, tmp, server):
+    cparser = ConfigParser()
+    cparser.read(args.config_file)
+    config = Config(cparser)
+    config.seed_urls = site.seed_urls
+    config.cache_server = server.address if server else ("localhost", 0)
+    config.save_file = os.path.join(tmp, args.save)
+    config.stats_file = os.path.join(tmp, "crawler_statistics.txt")
+    config.time_delay = args.politeness
+    config.threads_count = args.threads
+    config.mode = args.mode
+    config.parse_processes = args.parse_processes
+    config.frontier_scorer = args.scorer
+    config.metrics_file = os.path.join(tmp, "crawler_metrics.json")
+    # the page cache is thrown away with tmp unless one is given
+    config.page_cache = os.path.abspath(args.page_cache) if args.page_cache else os.path.join(tmp, "page_cache.sqlite")
+    config.recrawl = args.recrawl
+    config.archive = os.path.abspath(args.archive) if args.archive else ""
+    return config
+
+
+def run_crawl(args):
+    site = SyntheticSite(pages_per_host=args.pages_per_host) if args.site == "synthetic" else RecordedSite(args.site)
+    kinds = Counter()
+    server = None
+    in_process = None
+    if args.transport == "http":
+        server = StubCacheServer(latency=args.latency, site=site).start()
+        kinds = server.kinds
+    else:
+        in_process = crawler.worker.download = make_download(site, kinds)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(args, site, tmp, server)
+        cwd = os.getcwd()
+        # the crawl writes logs and count_stats.txt to the working directory
+        os.chdir(tmp)
+        try:
+            crawl = Crawler(config, True, frontier_factory=get_frontier_factory(config),
+                            worker_factory=get_worker_factory(config))
+            if in_process is not None and scraper.robots is not None:
+                # robots.txt from the site too, not from a cache server
+                scraper.robots = RobotsCache(make_robots_fetch(config, in_process), config.user_agent, config.robots_ttl)
+            if args.max_fetches:
+                limit_fetches(crawl.frontier, args.max_fetches)
+            install_timers(crawl.frontier)
+            monitor = Monitor(crawl.frontier, args.sample_seconds)
+            monitor.start()
+            start = time.perf_counter()
+            crawl.start_async()
+            for worker in crawl.workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            # the last sample is taken before join() closes the frontier
+            monitor.stop()
+            crawl.join()
+        finally:
+            os.chdir(cwd)
+
+    pages = scraper.crawl_stats.pages
+    stages = {}
+    for stage, values in sorted(timings.items()):
+        values = sorted(values)
+        stages[stage] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.5) * 1e3, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1e3, 3),
+            "total_s": round(sum(values), 3),
+        }
+    return {
+        "settings": {name: getattr(args, name) for name in (
+            "site", "pages_per_host", "transport", "mode", "threads", "parse_processes", "save", "latency",
+            "scorer", "max_fetches", "recrawl")},
+        "seconds": round(elapsed, 3),
+        "fetched": sum(kinds.values()),
+        "fetched_by_kind": dict(kinds),
+        "pages_recorded": pages,
+        "pages_per_sec": round(sum(kinds.values()) / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+        "stages": stages,
+        # counters of utils.metrics: responses by status, skipped links by reason, errors by type
+        "counters": json.loads(metrics.to_json())["counters"],
+        "timeline": monitor.samples,
+    }
+
+
+def print_report(report):
+    print(f"{report['fetched']} fetches in {report['seconds']}s: {report['pages_per_sec']} pages/sec, "
+          f"{report['pages_recorded']} pages recorded, peak rss {report['peak_rss_mb']} MiB")
+    print("fetched by kind: " + ", ".join(f"{kind} {count}" for kind, count in sorted(report["fetched_by_kind"].items())))
+    for name, value in report["counters"].items():
+        print(f"{name}: {value}")
+    print(f"{'stage':26} {'count':>8} {'p50 ms':>9} {'p99 ms':>9} {'total s':>9}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:26} {row['count']:8d} {row['p50_ms']:9.3f} {row['p99_ms']:9.3f} {row['total_s']:9.3f}")
+    print(f"{'seconds':>8} {'pages':>7} {'frontier':>9} {'rss MiB':>8}")
+    for sample in report["timeline"]:
+        print(f"{sample['seconds']:8.1f} {sample['pages']:7d} {sample['frontier']:9d} {sample['rss_mb']:8.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", default="config.ini")
+    parser.add_argument("--site", default="synthetic",
+                        help="synthetic, or a directory of saved pages laid out as <host>/<path>")
+    parser.add_argument("--pages-per-host", type=int, default=250)
+    parser.add_argument("--transport", choices=["http", "inprocess"], default="http")
+    parser.add_argument("--mode", choices=["threads", "async"], default="threads")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--parse-processes", type=int, default=0)
+    parser.add_argument("--save", default="frontier.shelve",
+                        help="save file name, its extension picks the frontier backend")
+    parser.add_argument("--scorer", choices=["lifo", "depth", "yield"], default="lifo")
+    parser.add_argument("--max-fetches", type=int, default=0, help="stop after this many downloads")
+    parser.add_argument("--page-cache", help="page cache file kept after the crawl, for a later --recrawl")
+    parser.add_argument("--recrawl", action="store_true", help="reuse the page cache like launch.py --recrawl")
+    parser.add_argument("--archive", help="archive the downloaded pages in this directory")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub server waits per request")
+    parser.add_argument("--politeness", type=float, default=0.0)
+    parser.add_argument("--sample-seconds", type=float, default=1.0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare pages/sec with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # the per-page log lines and debug prints would drown the report
+    logging.disable(logging.INFO)
+    # parser processes inherit stdout, so it is redirected at the descriptor
+    report_out = os.fdopen(os.dup(1), "w")
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+    report = run_crawl(args)
+    sys.stdout.flush()
+    sys.stdout = report_out
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        floor = baseline["pages_per_sec"] * (1 - args.tolerance)
+        if report["pages_per_sec"] < floor:
+            print(f"REGRESSION: {report['pages_per_sec']} pages/sec is below {floor:.1f} "
+                  f"({baseline['pages_per_sec']} in the baseline)")
+            sys.exit(1)
+        print(f"ok: within {args.tolerance:.0%} of the baseline's {baseline['pages_per_sec']} pages/sec")
@@ -0,0 +1,80 @@
+"""
+Per-page cost of the statistics update as the vocabulary grows: the old
+sort-and-rewrite-every-page approach against TopKCounter + StatsWriter.
+
+usage: python -m benchmarks.bench_crawl_stats [--pages N] [--window N] [--skip-old]
+"""
+import os
+import random
+import tempfile
+import time
+from argparse import ArgumentParser
+from itertools import islice
+
+from utils.crawl_stats import TopKCounter, StatsWriter
+from utils.tokenizer import compute_word_frequencies
+
+
+def synthetic_pages(pages, seed=121, words_per_page=300, new_words_per_page=5):
+    """yields token lists whose vocabulary keeps growing, like a real crawl"""
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(1000)]
+    for _ in range(pages):
+        for _ in range(new_words_per_page):
+            vocab.append(f"w{len(vocab)}")
+        # zipf-like: a few common words and a long tail
+        yield [vocab[min(int(rng.paretovariate(1.1)) - 1, len(vocab) - 1)]
+               if rng.random() < 0.8 else rng.choice(vocab)
+               for _ in range(words_per_page)]
+
+
+def old_stats(path):
+    counts = {}
+
+    def page(tokens):
+        for token, count in compute_word_frequencies(tokens).items():
+            counts[token] = counts.get(token, 0) + count
+        with open(path, "w") as f:
+            sorted_freqs = {t: c for t, c in sorted(counts.items(), key=lambda item: item[1], reverse=True)}
+            for word, freq in islice(sorted_freqs.items(), 50):
+                f.write(f"{word}: {freq}\n")
+    return page
+
+
+def new_stats(path):
+    counter = TopKCounter(50)
+    writer = StatsWriter(
+        lambda: "".join(f"{word}: {freq}\n" for word, freq in counter.most_common()), path)
+
+    def page(tokens):
+        counter.update(compute_word_frequencies(tokens))
+        writer.page_done()
+    return page
+
+
+def run(name, page, pages, window):
+    print(f"{name}:")
+    elapsed = 0.0
+    for i, tokens in enumerate(synthetic_pages(pages), 1):
+        start = time.perf_counter()
+        page(tokens)
+        elapsed += time.perf_counter() - start
+        if i % window == 0:
+            print(f"  pages {i - window + 1:>7}-{i:<7} {elapsed / window * 1e6:9.1f} us/page")
+            elapsed = 0.0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100000)
+    parser.add_argument("--window", type=int, default=10000)
+    parser.add_argument("--old-pages", type=int, default=10000,
+                        help="pages to run the old approach for, it slows down quickly")
+    parser.add_argument("--skip-old", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crawler_statistics.txt")
+        if not args.skip_old:
+            run("sort and rewrite every page", old_stats(path), args.old_pages, max(args.old_pages // 10, 1))
+        run("incremental top-k, debounced writer", new_stats(path), args.pages, args.window)
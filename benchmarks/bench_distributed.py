@@ -0,0 +1,105 @@
+"""
+A distributed crawl (crawler/distributed.py) of the synthetic site with 1, 2
+and 4 local crawler processes against one stub cache server, next to the
+same crawl in a single process without NODES. Reports the wall time, the
+downloads the server answered, the robots.txt among them, and the merged
+statistics of each crawl, which should match the single process crawl's.
+
+usage: python -m benchmarks.bench_distributed [--nodes 1,2,4] [--pages-per-host N] [--threads N] [--latency SECONDS]
+"""
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+from benchmarks.stub_cache_server import StubCacheServer
+from benchmarks.synthetic_site import SyntheticSite
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def run_node(args):
+    # one crawler process, started by crawl() below
+    import builtins
+    from crawler import Crawler, get_frontier_factory
+    from crawler.distributed import node_config
+    from utils.config import Config
+
+    # the per-page log lines and debug prints would drown the report
+    logging.disable(logging.INFO)
+    builtins.print = lambda *args, **kwargs: None
+    os.chdir(args.tmp)
+    cparser = ConfigParser()
+    cparser.read(args.config_file)
+    config = Config(cparser)
+    config.seed_urls = SyntheticSite(pages_per_host=args.pages_per_host).seed_urls
+    config.cache_server = ("localhost", args.cache_port)
+    config.time_delay = 0.0
+    config.threads_count = args.threads
+    config.save_file = "frontier.shelve"
+    config.stats_file = "crawler_statistics.txt"
+    config.metrics_file = "crawler_metrics.json"
+    config.page_cache = ""
+    config.archive = ""
+    if args.addresses:
+        config.nodes = [("localhost", int(port)) for port in args.addresses.split(",")]
+        node_config(config, args.run_node)
+    Crawler(config, True, frontier_factory=get_frontier_factory(config)).start()
+
+
+def crawl(args, nodes, server):
+    fetched = sum(server.kinds.values())
+    robots = server.kinds["robots"]
+    with tempfile.TemporaryDirectory() as tmp:
+        addresses = ",".join(str(free_port()) for _ in range(nodes))
+        command = [sys.executable, "-m", "benchmarks.bench_distributed", "--tmp", tmp,
+                   "--config_file", os.path.abspath(args.config_file),
+                   "--cache-port", str(server.address[1]), "--threads", str(args.threads),
+                   "--pages-per-host", str(args.pages_per_host), "--addresses", addresses if nodes else ""]
+        start = time.perf_counter()
+        processes = [subprocess.Popen(command + ["--run-node", str(node)], stdout=subprocess.DEVNULL)
+                     for node in range(max(nodes, 1))]
+        for process in processes:
+            process.wait()
+        seconds = time.perf_counter() - start
+        with open(os.path.join(tmp, "crawler_statistics.txt")) as f:
+            longest = f.readline().strip() + " " + f.readline().strip()
+        with open(os.path.join(tmp, "count_stats.txt")) as f:
+            urls = json.load(f)["num_urls"]
+    return seconds, sum(server.kinds.values()) - fetched, server.kinds["robots"] - robots, urls, longest
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", default="config.ini")
+    parser.add_argument("--nodes", default="1,2,4")
+    parser.add_argument("--pages-per-host", type=int, default=250)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub server waits per request")
+    # the options of one crawler process
+    parser.add_argument("--run-node", type=int)
+    parser.add_argument("--tmp")
+    parser.add_argument("--cache-port", type=int)
+    parser.add_argument("--addresses", default="")
+    args = parser.parse_args()
+
+    if args.run_node is not None:
+        run_node(args)
+        sys.exit(0)
+
+    server = StubCacheServer(latency=args.latency, site=SyntheticSite(pages_per_host=args.pages_per_host)).start()
+    # every node fetches the robots.txt of the hosts it finds links to, its own or not
+    print(f"{'nodes':>9} {'seconds':>8} {'fetches':>8} {'robots':>7} {'urls':>6}  longest page")
+    for nodes in [0] + [int(n) for n in args.nodes.split(",")]:
+        seconds, fetched, robots, urls, longest = crawl(args, nodes, server)
+        print(f"{nodes if nodes else 'no NODES':>9} {seconds:8.2f} {fetched:8d} {robots:7d} {urls:6d}  {longest}")
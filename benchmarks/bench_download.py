@@ -0,0 +1,111 @@
+"""
+Downloads through a local stub cache server (benchmarks.stub_cache_server) with
+the old one-request-per-url code, the pooled download() and AsyncDownloader,
+then crawls the stub site with the threads and the async worker modes.
+
+usage: python -m benchmarks.bench_download [--urls N] [--latency SECONDS] [--fail-rate R]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+
+import cbor
+import requests
+
+import scraper
+from benchmarks.stub_cache_server import StubCacheServer
+from crawler import Crawler, get_frontier_factory, get_worker_factory
+from utils.config import Config
+from utils.download import AsyncDownloader, download
+from utils.response import Response
+
+
+def old_download(url, config):
+    # what utils.download did before: a new connection per url, no retries
+    host, port = config.cache_server
+    resp = requests.get(f"http://{host}:{port}/", params=[("q", url), ("u", config.user_agent)])
+    return Response(cbor.loads(resp.content)) if resp.ok else None
+
+
+def make_config(config_file, server, **overrides):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    config.cache_server = server.address
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return config
+
+
+def timed(name, urls, func):
+    start = time.perf_counter()
+    results = func(urls)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for resp in results if resp is not None and resp.status == 200)
+    print(f"{name:32} {len(urls) / elapsed:8.0f} urls/sec  ({ok}/{len(urls)} ok)")
+
+
+def run_async(config, urls):
+    async def fetch_all():
+        async with AsyncDownloader(config) as downloader:
+            return await asyncio.gather(*(downloader.download(url) for url in urls))
+    return asyncio.run(fetch_all())
+
+
+def crawl(config_file, server, mode, threads):
+    # the crawl writes its save and stats files, keep them out of the repo
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(
+            config_file, server, mode=mode, threads_count=threads, time_delay=0.0,
+            save_file=os.path.join(tmp, "frontier.sqlite"), stats_file=os.path.join(tmp, "stats.txt"))
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            crawler = Crawler(config, True, frontier_factory=get_frontier_factory(config),
+                              worker_factory=get_worker_factory(config))
+            # crawl_stats lives in the scraper module and keeps counting across crawls
+            pages_before = scraper.crawl_stats.pages
+            start = time.perf_counter()
+            crawler.start()
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    return scraper.crawl_stats.pages - pages_before, elapsed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", default="config.ini")
+    parser.add_argument("--urls", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the stub waits per request")
+    parser.add_argument("--fail-rate", type=float, default=0.05, help="share of 503 replies")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--no-crawl", action="store_true")
+    args = parser.parse_args()
+
+    server = StubCacheServer(latency=args.latency, fail_rate=args.fail_rate).start()
+    config = make_config(args.config_file, server, download_backoff=0.01)
+    urls = [f"https://www.ics.uci.edu/p/{i}" for i in range(args.urls)]
+
+    with ThreadPoolExecutor(args.threads) as pool:
+        timed(f"old requests.get, {args.threads} threads", urls,
+              lambda urls: list(pool.map(lambda url: old_download(url, config), urls)))
+        timed(f"pooled download, {args.threads} threads", urls,
+              lambda urls: list(pool.map(lambda url: download(url, config), urls)))
+    timed(f"AsyncDownloader, {config.async_concurrency} in flight", urls,
+          lambda urls: run_async(config, urls))
+    if args.no_crawl:
+        sys.exit(0)
+
+    # silence the per-link debug prints of scraper and worker
+    import builtins
+    builtins.print = lambda *a, **k: None
+    for mode in ("threads", "async"):
+        pages, elapsed = crawl(args.config_file, server, mode, args.threads if mode == "threads" else 1)
+        sys.stderr.write(f"crawl in {mode} mode: {pages} pages in {elapsed:.1f}s "
+                         f"({pages / elapsed:.0f} pages/sec)\n")
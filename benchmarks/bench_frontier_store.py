@@ -0,0 +1,71 @@
+"""
+Per-link add_url cost and restart time of the shelve frontier against the
+append-only log and SQLite frontiers, and the per-link cost when the links
+of a page are added in one mark_complete_and_add call.
+
+usage: python -m benchmarks.bench_frontier_store [--urls N] [--links-per-page N]
+"""
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+from crawler.frontier import Frontier, LogFrontier
+from crawler.sqlite_frontier import SqliteFrontier
+
+
+def make_config(save_file):
+    return SimpleNamespace(
+        save_file=save_file, time_delay=0.0, frontier_scorer="lifo",
+        seed_urls=["https://www.ics.uci.edu"])
+
+
+def bench(name, factory, save_file, urls):
+    config = make_config(save_file)
+    frontier = factory(config, True)
+    start = time.perf_counter()
+    for url in urls:
+        frontier.add_url(url)
+    for url in urls[::2]:
+        frontier.mark_url_complete(url)
+    elapsed = time.perf_counter() - start
+    frontier.close()
+
+    start = time.perf_counter()
+    frontier = factory(config, False)
+    restart = time.perf_counter() - start
+    frontier.close()
+    print(f"{name:8} {elapsed / (len(urls) * 1.5) * 1e6:8.1f} us/write   restart {restart:6.2f}s")
+
+
+def bench_batched(name, factory, save_file, urls, links_per_page):
+    config = make_config(save_file)
+    frontier = factory(config, True)
+    start = time.perf_counter()
+    # every page completes the previous one and discovers the next links
+    page_url = config.seed_urls[0]
+    for i in range(0, len(urls), links_per_page):
+        frontier.mark_complete_and_add(page_url, urls[i:i + links_per_page])
+        page_url = urls[i]
+    elapsed = time.perf_counter() - start
+    frontier.close()
+    print(f"{name:8} {elapsed / len(urls) * 1e6:8.1f} us/link in pages of {links_per_page} links")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=20000)
+    parser.add_argument("--links-per-page", type=int, default=40)
+    args = parser.parse_args()
+
+    urls = [f"https://www.ics.uci.edu/page/{i}" for i in range(args.urls)]
+    with tempfile.TemporaryDirectory() as tmp:
+        # get_logger writes to ./Logs
+        os.chdir(tmp)
+        bench("shelve", Frontier, os.path.join(tmp, "frontier.shelve"), urls)
+        bench("log", LogFrontier, os.path.join(tmp, "frontier.log"), urls)
+        bench("sqlite", SqliteFrontier, os.path.join(tmp, "frontier.sqlite"), urls)
+        bench_batched("shelve", Frontier, os.path.join(tmp, "batched.shelve"), urls, args.links_per_page)
+        bench_batched("log", LogFrontier, os.path.join(tmp, "batched.log"), urls, args.links_per_page)
+        bench_batched("sqlite", SqliteFrontier, os.path.join(tmp, "batched.sqlite"), urls, args.links_per_page)
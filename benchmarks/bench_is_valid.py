@@ -0,0 +1,106 @@
+"""
+Compares scraper.is_valid with the version it replaced, which parsed the url
+once per rule and ran every check on every call, by filtering the links of
+synthetic site pages. Both must keep the same links.
+
+usage: python -m benchmarks.bench_is_valid [--pages N]
+"""
+import re
+import time
+from argparse import ArgumentParser
+from urllib.parse import urlparse
+
+import scraper
+from benchmarks.corpus import CorpusResponse, RawResponse
+from benchmarks.synthetic_site import SyntheticSite
+from utils.page_analysis import analyze_page
+
+
+def legacy_within_domains(url):
+    allowed = ['ics.uci.edu', 'cs.uci.edu', 'informatics.uci.edu', 'stat.uci.edu']
+    hostname = urlparse(url).netloc
+    hostname = hostname.removeprefix('www.')
+    if hostname not in allowed:
+        return False
+    return True
+
+
+def legacy_is_not_known_trap(url):
+    trap_patterns = ["https://isg.ics.uci.edu/events/*",
+                     "gitlab.ics.uci.edu",
+                     "http://fano.ics.uci.edu/ca/rules/",
+                     "/calendar", "/events"]
+    parsed = urlparse(url)
+    path = parsed.path.lower()
+    query = parsed.query.lower()
+    for pattern in trap_patterns:
+        if pattern in path or pattern in query:
+            return False
+    return True
+
+
+def legacy_is_valid(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    if not legacy_within_domains(url):
+        return False
+    if not scraper.builtin_robots_rules(url):
+        return False
+    if not legacy_is_not_known_trap(url):
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|mpg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso|bib|pov|ff|lif"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|c|cpp|cp|h|xml|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+
+
+# urls the synthetic site never links to, to cover every rule
+EXTRA_LINKS = [
+    "mailto:someone@uci.edu", "ftp://www.ics.uci.edu/a", "https://www.uci.edu/", "https://vision.ics.uci.edu/",
+    "https://www.ics.uci.edu/people/x", "https://www.informatics.uci.edu/research/other",
+    "https://www.informatics.uci.edu/research/phd-research/y", "https://www.informatics.uci.edu/wp-admin/x.php",
+    "https://www.stat.uci.edu/files/a.PDF", "https://www.cs.uci.edu/a.tar.gz", "https://www.cs.uci.edu/a.css/",
+    "https://www.cs.uci.edu/file.pdf;jsessionid=1", "https://www.ics.uci.edu/x?view=/calendar",
+    "https://www.ics.uci.edu/Events/2019", "https://www.ics.uci.edu/c", "https://www.ics.uci.edu/x.c",
+]
+
+
+def link_lists(pages):
+    site = SyntheticSite(pages_per_host=max(1, pages // len(SyntheticSite().hosts)))
+    lists = []
+    for host in site.hosts:
+        for path in site.paths[host]:
+            url = f"https://{host}{path}"
+            status, content, _ = site.fetch(url)
+            page = analyze_page(CorpusResponse(url, status, None, RawResponse(url, content)))
+            lists.append(list(page.links) + EXTRA_LINKS)
+    return lists
+
+
+def filter_rate(is_valid, lists):
+    start = time.perf_counter()
+    kept = [[link for link in links if is_valid(link)] for links in lists]
+    return len(lists) / (time.perf_counter() - start), kept
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=1000)
+    args = parser.parse_args()
+
+    lists = link_lists(args.pages)
+    links = sum(len(page_links) for page_links in lists)
+    # the builtin rules only, like a crawl whose robots.txt fetches failed
+    scraper.robots = None
+    legacy_rate, legacy_kept = filter_rate(legacy_is_valid, lists)
+    rate, kept = filter_rate(scraper.is_valid, lists)
+    print(f"{len(lists)} pages, {links} links, "
+          f"{'same links kept' if kept == legacy_kept else 'DIFFERENT LINKS KEPT'}")
+    print(f"legacy is_valid  {legacy_rate:10.1f} pages/sec")
+    print(f"is_valid         {rate:10.1f} pages/sec ({rate / legacy_rate:.1f}x)")
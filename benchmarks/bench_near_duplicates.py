@@ -0,0 +1,67 @@
+"""
+SimHash speed and how well DuplicateDetector separates near-duplicate pages
+(a few words edited, e.g. a calendar page with another date) from distinct ones.
+
+usage: python -m benchmarks.bench_near_duplicates [--pages N] [--edits N] [--distance N]
+"""
+import random
+import time
+from argparse import ArgumentParser
+from hashlib import blake2b
+
+from benchmarks.corpus import WORDS
+from utils.fingerprint import DuplicateDetector, simhash
+
+
+def naive_simhash(tokens):
+    # textbook version, one addition per bit per token
+    weights = [0] * 64
+    for token in tokens:
+        h = int.from_bytes(blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        for i in range(64):
+            weights[i] += 1 if h >> i & 1 else -1
+    return sum(1 << i for i in range(64) if weights[i] > 0)
+
+
+def make_page(rng, n_words=600):
+    # a wider vocabulary than WORDS so distinct pages really differ
+    return [rng.choice(WORDS) + str(rng.randint(0, 200)) for _ in range(n_words)]
+
+
+def edit(rng, tokens, edits):
+    tokens = list(tokens)
+    for _ in range(edits):
+        tokens[rng.randrange(len(tokens))] = f"edit{rng.randint(0, 10 ** 6)}"
+    return tokens
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=5)
+    parser.add_argument("--distance", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(121)
+    originals = [make_page(rng) for _ in range(args.pages)]
+    variants = [edit(rng, page, args.edits) for page in originals]
+
+    start = time.perf_counter()
+    for page in originals[:200]:
+        naive_simhash(page)
+    naive = (time.perf_counter() - start) / 200
+    start = time.perf_counter()
+    for page in originals:
+        simhash(page)
+    fast = (time.perf_counter() - start) / len(originals)
+    print(f"simhash of a 600 word page: naive {naive * 1e3:.2f} ms, lanes {fast * 1e3:.3f} ms")
+
+    detector = DuplicateDetector(max_distance=args.distance)
+    start = time.perf_counter()
+    false_positives = sum(detector.check_and_add(page)[0] for page in originals)
+    caught = sum(detector.check_and_add(page)[0] for page in variants)
+    elapsed = time.perf_counter() - start
+    print(f"{2 * args.pages} lookups in {elapsed:.2f}s "
+          f"({elapsed / (2 * args.pages) * 1e6:.0f} us each)")
+    print(f"distinct pages flagged as duplicates: {false_positives}/{args.pages}")
+    print(f"pages with {args.edits} edited words caught: {caught}/{args.pages}")
@@ -0,0 +1,67 @@
+"""
+Compares the old three-parse page pipeline with utils.page_analysis.analyze_page
+(BeautifulSoup and lxml stream engines).
+
+usage: python -m benchmarks.bench_page_analysis [html_dir] [--repeat N]
+"""
+import time
+from argparse import ArgumentParser
+from urllib.parse import urljoin, urldefrag
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import load_corpus
+from utils.page_analysis import analyze_page
+from utils.tokenizer import tokenize
+
+
+def three_parse_pipeline(url, resp):
+    """the per-page parsing done by scraper.extract_next_links before the single-parse stage"""
+    content = resp.raw_response.content
+    soup = BeautifulSoup(content, 'lxml')
+    tokens = tokenize(soup.get_text(separator=' '))
+
+    soup = BeautifulSoup(content, 'lxml')
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    words = tokenize(soup.get_text(separator=' '))
+
+    links = []
+    soup = BeautifulSoup(content, 'lxml')
+    for link in soup.find_all('a'):
+        href = link.get('href')
+        if href:
+            links.append(urldefrag(urljoin(resp.url, href))[0])
+    return tokens, words, links
+
+
+def single_parse_pipeline(url, resp):
+    return analyze_page(resp, "bs4")
+
+
+def stream_pipeline(url, resp):
+    return analyze_page(resp, "stream")
+
+
+def run(pipeline, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url, resp in corpus:
+            pipeline(url, resp)
+    elapsed = time.perf_counter() - start
+    return len(corpus) * repeat / elapsed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("html_dir", nargs="?", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.html_dir)
+    old = run(three_parse_pipeline, corpus, args.repeat)
+    new = run(single_parse_pipeline, corpus, args.repeat)
+    stream = run(stream_pipeline, corpus, args.repeat)
+    print(f"pages: {len(corpus)} x {args.repeat}")
+    print(f"three parses: {old:8.1f} pages/sec")
+    print(f"single parse: {new:8.1f} pages/sec ({new / old:.2f}x)")
+    print(f"lxml stream:  {stream:8.1f} pages/sec ({stream / old:.2f}x)")
@@ -0,0 +1,73 @@
+"""
+Pages/sec of scraping a corpus from several worker threads, parsing in the
+threads themselves and in parser pools (utils.parse_pool) of growing size.
+Parsing only scales with processes up to the number of cores.
+
+usage: python -m benchmarks.bench_parse_pool [html_dir] [--pages N] [--threads N] [--processes 1,2,4]
+"""
+import os
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+import scraper
+from benchmarks.corpus import load_corpus
+from utils.crawl_stats import StatsWriter
+from utils.fingerprint import DuplicateDetector
+from utils.parse_pool import ParsePool
+
+
+def scrape_all(corpus, threads, pool):
+    def scrape(item):
+        url, resp = item
+        if pool is None:
+            return scraper.scraper(url, resp)
+        return scraper.record_result(url, pool.analyze(url, resp))
+
+    # a fresh index, otherwise repeated runs only see duplicates
+    scraper.duplicate_detector = DuplicateDetector()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        links = sum(len(found) for found in executor.map(scrape, corpus))
+    return len(corpus) / (time.perf_counter() - start), links
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("html_dir", nargs="?", default=None)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", default=None,
+                        help="comma separated pool sizes (default: 1, 2, 4, ... up to the core count)")
+    args = parser.parse_args()
+
+    if args.processes:
+        sizes = [int(size) for size in args.processes.split(",")]
+    else:
+        sizes = [1]
+        while sizes[-1] * 2 <= (os.cpu_count() or 1):
+            sizes.append(sizes[-1] * 2)
+
+    # silence the per-link debug prints of scraper, here and in the parser
+    # processes, which inherit stdout
+    report_fd = os.dup(1)
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+
+    # keep the statistics the scraper writes out of the repo
+    tmp = tempfile.TemporaryDirectory()
+    scraper.stats_writer = StatsWriter(scraper.render_stats, os.path.join(tmp.name, "stats.txt"))
+
+    corpus = load_corpus(args.html_dir, args.pages)
+    rate, links = scrape_all(corpus, args.threads, None)
+    report = [f"{os.cpu_count()} cores, {len(corpus)} pages, {args.threads} worker threads",
+              f"parsing in threads     {rate:8.1f} pages/sec ({links} links)"]
+    for size in sizes:
+        pool = ParsePool(size, scraper.parser_engine)
+        # start the processes before timing
+        scrape_all(corpus[:size * 4], size, pool)
+        rate, links = scrape_all(corpus, args.threads, pool)
+        pool.close()
+        report.append(f"{size:2d} parser processes    {rate:8.1f} pages/sec ({links} links)")
+    os.write(report_fd, ("\n".join(report) + "\n").encode())
+    tmp.cleanup()
@@ -0,0 +1,45 @@
+"""
+A crawl of the synthetic site followed by a re-crawl of it with the page
+cache the first one left (launch.py --recrawl), through the replay harness
+(benchmarks.bench_crawl). The site does not change between the two, so every
+page of the re-crawl can reuse its saved result instead of being parsed.
+
+Every crawl runs in its own process, the crawl statistics are module state.
+
+usage: python -m benchmarks.bench_recrawl [--pages-per-host N] [--threads N] [--latency SECONDS]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+
+def run(args, tmp, name, recrawl):
+    report_file = os.path.join(tmp, f"{name}.json")
+    command = [sys.executable, "-m", "benchmarks.bench_crawl", "--threads", str(args.threads),
+               "--pages-per-host", str(args.pages_per_host), "--latency", str(args.latency),
+               "--page-cache", os.path.join(tmp, "page_cache.sqlite"), "--json", report_file]
+    if recrawl:
+        command.append("--recrawl")
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    with open(report_file) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages-per-host", type=int, default=250)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"{'crawl':8} {'fetches':>8} {'recorded':>9} {'seconds':>8} {'parse s':>8} {'cache hits':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, recrawl in (("crawl", False), ("recrawl", True)):
+            report = run(args, tmp, name, recrawl)
+            parse = report["stages"].get("parse", {}).get("total_s", 0.0)
+            hits = report["counters"].get("page_cache", {}).get("hit", 0)
+            print(f"{name:8} {report['fetched']:8d} {report['pages_recorded']:9d} {report['seconds']:8.2f} "
+                  f"{parse:8.2f} {hits:11d}")
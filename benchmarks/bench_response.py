@@ -0,0 +1,93 @@
+"""
+Time and peak memory of handling cache server replies the way the scraper
+did before utils.response decoded lazily (unpickle every reply, parse it,
+then look at the size) and the way it does now (scraper.accept_response
+before anything is unpickled or parsed). The replies are a mix of ordinary
+pages, pages over MAX_RESPONSE_BYTES and binary files.
+
+usage: python -m benchmarks.bench_response [--pages N] [--large-bytes N] [--max-bytes N]
+"""
+import pickle
+import random
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from collections import namedtuple
+
+import cbor
+
+import scraper
+from benchmarks.corpus import synthetic_page
+from utils.page_analysis import analyze_page
+from utils.response import Response
+
+# RawResponse of benchmarks.corpus with the headers a requests.Response has
+HeadedResponse = namedtuple("HeadedResponse", ["url", "content", "headers"])
+
+
+def make_replies(pages, large_bytes):
+    rng = random.Random(121)
+    replies = []
+    for i in range(pages):
+        url = f"https://www.ics.uci.edu/p/{i}"
+        if i % 10 == 0:
+            # a page of repeated paragraphs, larger than the limit
+            content = synthetic_page(rng, "www.ics.uci.edu")
+            content = content * (large_bytes // len(content) + 1)
+            content_type = "text/html; charset=utf-8"
+        elif i % 10 == 1:
+            content = rng.randbytes(large_bytes // 4)
+            content_type = "application/pdf"
+        else:
+            content = synthetic_page(rng, "www.ics.uci.edu")
+            content_type = "text/html"
+        raw = HeadedResponse(url, content, {"Content-Type": content_type})
+        replies.append(cbor.dumps({"url": url, "status": 200, "response": pickle.dumps(raw)}))
+    return replies
+
+
+class EagerResponse(object):
+    """utils.response.Response as it was, unpickled on arrival"""
+    def __init__(self, resp_dict):
+        self.url = resp_dict["url"]
+        self.status = resp_dict["status"]
+        self.error = None
+        self.raw_response = pickle.loads(resp_dict["response"])
+
+
+def eager(reply):
+    # every page is parsed, its size only decided whether links were followed
+    return analyze_page(EagerResponse(cbor.loads(reply))).word_count
+
+
+def lazy(reply):
+    resp = Response(cbor.loads(reply))
+    if not scraper.accept_response(resp):
+        return 0
+    return analyze_page(resp).word_count
+
+
+def measure(handle, replies):
+    tracemalloc.start()
+    start = time.perf_counter()
+    words = sum(handle(reply) for reply in replies)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, words
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--large-bytes", type=int, default=8000000)
+    parser.add_argument("--max-bytes", type=int, default=5000000)
+    args = parser.parse_args()
+
+    replies = make_replies(args.pages, args.large_bytes)
+    scraper.max_response_bytes = args.max_bytes
+    scraper.content_types = frozenset(["text/html", "application/xhtml+xml", "text/plain"])
+    print(f"{len(replies)} replies, {sum(map(len, replies)) / 1e6:.0f} MB")
+    for name, handle in (("eager", eager), ("lazy", lazy)):
+        seconds, peak, words = measure(handle, replies)
+        print(f"{name:6} {len(replies) / seconds:9.1f} replies/sec  peak {peak / 1e6:7.1f} MB  {words} words parsed")
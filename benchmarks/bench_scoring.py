@@ -0,0 +1,44 @@
+"""
+Unique useful pages per 1,000 fetches for each frontier scorer
+(crawler/scoring.py), crawling the synthetic site through the replay harness
+(benchmarks.bench_crawl) with a fixed fetch budget. Useful pages are the
+content pages of the site, not traps, copies, dead links or robots.txt.
+
+Every scorer runs in its own process, the crawl statistics are module state.
+
+usage: python -m benchmarks.bench_scoring [--budget N] [--pages-per-host N] [--scorers lifo,depth,yield]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+
+def run(scorer, args, tmp):
+    report_file = os.path.join(tmp, f"{scorer}.json")
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_crawl", "--transport", "inprocess", "--threads", "1",
+         "--pages-per-host", str(args.pages_per_host), "--max-fetches", str(args.budget),
+         "--scorer", scorer, "--json", report_file],
+        check=True, stdout=subprocess.DEVNULL)
+    with open(report_file) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--budget", type=int, default=1000)
+    parser.add_argument("--pages-per-host", type=int, default=500)
+    parser.add_argument("--scorers", default="lifo,depth,yield")
+    args = parser.parse_args()
+
+    print(f"{'scorer':8} {'fetches':>8} {'useful':>7} {'per 1000':>9}  fetched by kind")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scorer in args.scorers.split(","):
+            report = run(scorer, args, tmp)
+            kinds = report["fetched_by_kind"]
+            useful = kinds.get("page", 0)
+            print(f"{scorer:8} {report['fetched']:8d} {useful:7d} {useful / report['fetched'] * 1000:9.1f}  "
+                  + ", ".join(f"{kind} {n}" for kind, n in sorted(kinds.items())))
@@ -0,0 +1,53 @@
+"""
+Memory per million seen urls for the structures a worker could keep them in.
+
+usage: python -m benchmarks.bench_seen_set [--urls N]
+"""
+import gc
+import hashlib
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from utils.seen_set import DigestSet, ScalableBloomFilter
+
+
+def url_digests(count):
+    for i in range(count):
+        yield hashlib.sha256(f"//www.ics.uci.edu/page/{i}?id={i * 7}".encode("utf-8")).digest()
+
+
+def measure(name, make, add, count):
+    digests = list(url_digests(count))
+    seen = make()
+    start = time.perf_counter()
+    for digest in digests:
+        add(seen, digest)
+    elapsed = time.perf_counter() - start
+    del seen, digests
+
+    # memory is measured in a second pass, tracemalloc slows every allocation
+    gc.collect()
+    tracemalloc.start()
+    seen = make()
+    for digest in url_digests(count):
+        add(seen, digest)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_million = current / count * 1e6 / 2 ** 20
+    print(f"{name:28} {current / count:7.1f} bytes/url  {per_million:8.1f} MiB per million  "
+          f"{elapsed / count * 1e6:5.2f} us/add")
+    del seen
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=1000000)
+    args = parser.parse_args()
+
+    print(f"{args.urls} urls")
+    measure("set of hex sha256 strings", set, lambda s, d: s.add(d.hex()), args.urls)
+    measure("set of 8-byte digests", set, lambda s, d: s.add(d[:8]), args.urls)
+    measure("DigestSet (8 bytes)", DigestSet, DigestSet.add, args.urls)
+    measure("DigestSet (16 bytes)", lambda: DigestSet(16), DigestSet.add, args.urls)
+    measure("ScalableBloomFilter (1e-4)", ScalableBloomFilter, ScalableBloomFilter.add, args.urls)
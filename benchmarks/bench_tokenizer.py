@@ -0,0 +1,124 @@
+"""
+Checks that utils.tokenizer gives exactly the tokens and frequencies of the
+original character-by-character tokenizer on random text, then compares speed.
+
+usage: python -m benchmarks.bench_tokenizer [--cases N] [--corpus DIR] [--pages N]
+"""
+import random
+import sys
+import time
+from argparse import ArgumentParser
+
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import load_corpus
+from utils.tokenizer import STOPWORDS, compute_word_frequencies, tokenize, tokenize_stream
+
+# the original implementation, kept as the reference
+STOPWORD_LIST = sorted(STOPWORDS)
+
+
+def reference_tokenize(readable_text):
+    tokens = []
+    token = ""
+    try:
+        for char in readable_text:
+            if ('a' <= char.lower() <= 'z') or ('0' <= char <= '9') or char == "'":
+                token += char.lower()
+            else:
+                if token:
+                    if not token.isdigit():
+                        tokens.append(token)
+                    token = ""
+        if token:
+            tokens.append(token)
+    except Exception:
+        return []
+    return tokens
+
+
+def reference_frequencies(tokens_list):
+    token_freqs = {}
+    for token in tokens_list:
+        if token in STOPWORD_LIST:
+            continue
+        if token in token_freqs:
+            token_freqs[token] += 1
+        else:
+            token_freqs[token] = 1
+    return token_freqs
+
+
+# characters picked to hit every branch: separators, digits, apostrophes,
+# stopwords, non-ascii letters and the two non-ascii capitals that lower to ascii
+ALPHABET = list("abcxyzABCXYZ0123456789'' \t\n.,-_/é߀ßΣσİKÅ̇ÿ")
+WORDS = ["the", "a", "i'm", "can't", "2024", "007", "x1", "İstanbul", "Kelvin", "'"]
+
+
+def random_text(rng):
+    parts = []
+    for _ in range(rng.randint(0, 40)):
+        if rng.random() < 0.3:
+            parts.append(rng.choice(WORDS))
+        else:
+            parts.append("".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 8))))
+    return "".join(parts)
+
+
+def random_chunks(rng, text):
+    cuts = sorted(rng.randint(0, len(text)) for _ in range(rng.randint(0, 5)))
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+
+def check_equivalence(cases, seed=121):
+    rng = random.Random(seed)
+    failures = 0
+    for _ in range(cases):
+        text = random_text(rng)
+        expected = reference_tokenize(text)
+        for name, got in (("tokenize", tokenize(text)),
+                          ("tokenize_stream", list(tokenize_stream(random_chunks(rng, text))))):
+            if got != expected:
+                failures += 1
+                print(f"{name} differs on {text!r}: {got} != {expected}")
+        if compute_word_frequencies(expected) != reference_frequencies(expected):
+            failures += 1
+            print(f"compute_word_frequencies differs on {expected}")
+    for bad in (None, 5, b"bytes"):
+        if tokenize(bad) != reference_tokenize(bad):
+            failures += 1
+            print(f"tokenize differs on {bad!r}")
+    return failures
+
+
+def best_of(runs, func, texts):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--corpus", help="directory of saved .html pages (default: synthetic)")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = check_equivalence(args.cases)
+    print(f"{args.cases} random texts: {'ok' if not failures else f'{failures} FAILURES'}")
+
+    texts = [BeautifulSoup(resp.raw_response.content, "lxml").get_text(separator=" ")
+             for _, resp in load_corpus(args.corpus, args.pages)]
+    token_lists = [reference_tokenize(text) for text in texts]
+    old = best_of(args.runs, reference_tokenize, texts)
+    new = best_of(args.runs, tokenize, texts)
+    print(f"tokenize                  {old / len(texts) * 1e3:7.3f} -> {new / len(texts) * 1e3:7.3f} ms/page")
+    old = best_of(args.runs, reference_frequencies, token_lists)
+    new = best_of(args.runs, compute_word_frequencies, token_lists)
+    print(f"compute_word_frequencies  {old / len(texts) * 1e3:7.3f} -> {new / len(texts) * 1e3:7.3f} ms/page")
+    sys.exit(1 if failures else 0)
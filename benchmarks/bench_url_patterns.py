@@ -0,0 +1,109 @@
+"""
+Compares utils.url_pattern_detection's UrlPatternClassifier with the
+per-call regex compilation it replaced, over a synthetic url corpus.
+
+usage: python -m benchmarks.bench_url_patterns [--urls N]
+"""
+import random
+import re
+import time
+from argparse import ArgumentParser
+
+from utils.url_pattern_detection import UrlPatternClassifier, get_url_parts, hash_url_pattern
+
+WORDS = ["research", "people", "faculty", "events", "news", "courses", "about", "labs",
+         "seminar", "wp-content", "uploads", "page", "category", "tag", "2019", "archive"]
+
+
+def legacy_segment_category(seg):
+    seg = seg.lower().strip()
+    UUID_RE = re.compile(
+        r"^[0-9a-fA-F]{8}-"
+        r"[0-9a-fA-F]{4}-"
+        r"[1-5][0-9a-fA-F]{3}-"
+        r"[89abAB][0-9a-fA-F]{3}-"
+        r"[0-9a-fA-F]{12}$"
+    )
+    DATE_RE = re.compile(r"^\d{4}[-/]\d{2}[-/]\d{2}$")
+    INT_RE = re.compile(r"^\d+$")
+    DASHED_SLUG_RE = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+)+$")
+    HEX_RE = re.compile(r"^[0-9a-fA-F]{8,}$")
+    if UUID_RE.match(seg):
+        return "UUID"
+    if DATE_RE.match(seg):
+        return "DATE"
+    if INT_RE.match(seg):
+        return "INT"
+    if HEX_RE.match(seg):
+        return "HEX"
+    if DASHED_SLUG_RE.match(seg):
+        return "SLUG"
+    return seg
+
+
+def legacy_drop_control_query_params(query_dict):
+    DROP_QUERY_KEY_PATTERNS = [
+        re.compile(r"^utm_", re.IGNORECASE),
+        re.compile(r"^_g", re.IGNORECASE),
+        re.compile(r"session", re.IGNORECASE),
+        re.compile(r"^sid$", re.IGNORECASE),
+    ]
+    return {
+        key: val
+        for key, val in query_dict.items()
+        if not any(p.search(key.lower()) for p in DROP_QUERY_KEY_PATTERNS)
+    }
+
+
+def legacy_url_pattern_hash(url):
+    domain, path, query_str_dict = get_url_parts(url)
+    path_list = map(legacy_segment_category, path.split('/'))
+    query_str_dict = legacy_drop_control_query_params(query_str_dict)
+    query_list = [f"{key.lower()}={legacy_segment_category(val)}" for key, val in sorted(query_str_dict.items())]
+    return hash_url_pattern(f"{domain}{'/'.join(path_list)}?{'&'.join(query_list)}")
+
+
+def random_segment(rng):
+    kind = rng.randrange(8)
+    if kind == 0:
+        return str(rng.randrange(10 ** 6))
+    if kind == 1:
+        return f"{rng.randrange(2000, 2030)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+    if kind == 2:
+        return "%08x-%04x-4%03x-a%03x-%012x" % tuple(rng.randrange(16 ** n) for n in (8, 4, 3, 3, 12))
+    if kind == 3:
+        return "%x" % rng.randrange(16 ** 10)
+    if kind == 4:
+        return "-".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+    return rng.choice(WORDS).upper() if kind == 5 else rng.choice(WORDS)
+
+
+def url_corpus(count, seed=121):
+    rng = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        host = rng.choice(["www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu"])
+        path = "/".join(random_segment(rng) for _ in range(rng.randint(1, 5)))
+        query = "&".join(f"{k}={random_segment(rng)}" for k in rng.sample(
+            ["id", "page", "utm_source", "sessionid", "sid", "tab", "_ga", "date"], rng.randint(0, 3)))
+        urls.append(f"https://{host}/{path}" + (f"?{query}" if query else ""))
+    return urls
+
+
+def run(name, fn, urls):
+    start = time.perf_counter()
+    hashes = [fn(url) for url in urls]
+    elapsed = time.perf_counter() - start
+    print(f"{name:28} {elapsed / len(urls) * 1e6:7.2f} us/url")
+    return hashes
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=200000)
+    args = parser.parse_args()
+
+    urls = url_corpus(args.urls)
+    old = run("per-call compiled regexes", legacy_url_pattern_hash, urls)
+    new = run("UrlPatternClassifier", UrlPatternClassifier().get_url_pattern_hash, urls)
+    print("identical hashes:", old == new)
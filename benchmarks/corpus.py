@@ -0,0 +1,58 @@
+import os
+import random
+from collections import namedtuple
+
+# minimal stand-ins for utils.response.Response and the raw requests response
+RawResponse = namedtuple("RawResponse", ["url", "content"])
+CorpusResponse = namedtuple("CorpusResponse", ["url", "status", "error", "raw_response"])
+
+WORDS = [
+    "informatics", "research", "students", "faculty", "computing", "graduate",
+    "statistics", "department", "software", "machine", "learning", "data",
+    "systems", "network", "security", "undergraduate", "course", "seminar",
+    "professor", "lab", "project", "thesis", "algorithm", "theory", "design",
+]
+
+
+def synthetic_page(rng, host, n_words=600, n_links=80):
+    """returns html bytes resembling a department page"""
+    paragraphs = []
+    for _ in range(n_words // 60):
+        paragraphs.append("<p>" + " ".join(rng.choice(WORDS) for _ in range(60)) + "</p>")
+    links = []
+    for i in range(n_links):
+        path = "/".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        links.append(f'<li><a href="/{path}/{i}">{rng.choice(WORDS)}</a></li>')
+    return (
+        "<html><head><title>synthetic</title>"
+        "<style>body { color: black; }</style>"
+        "<script>var x = 1; function f() { return x; }</script></head>"
+        f"<body><nav><ul>{''.join(links)}</ul></nav>"
+        f"<main>{''.join(paragraphs)}</main>"
+        f"<footer><a href='https://{host}/about'>about</a></footer></body></html>"
+    ).encode("utf-8")
+
+
+def load_corpus(path=None, count=200, seed=121):
+    """
+    Loads saved html files from path as (url, response) pairs. When no path is
+    given a synthetic corpus of count pages is generated instead.
+    """
+    corpus = []
+    if path:
+        for name in sorted(os.listdir(path)):
+            if not name.endswith((".html", ".htm")):
+                continue
+            with open(os.path.join(path, name), "rb") as f:
+                content = f.read()
+            url = f"https://www.ics.uci.edu/{name.rsplit('.', 1)[0]}"
+            corpus.append((url, CorpusResponse(url, 200, None, RawResponse(url, content))))
+        return corpus
+
+    rng = random.Random(seed)
+    for i in range(count):
+        host = rng.choice(["www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu"])
+        url = f"https://{host}/page/{i}"
+        content = synthetic_page(rng, host)
+        corpus.append((url, CorpusResponse(url, 200, None, RawResponse(url, content))))
+    return corpus
@@ -0,0 +1,74 @@
+"""
+Hammers one CrawlStats from many threads and checks that the global totals
+and the url-pattern/subdomain limits come out exact.
+
+usage: python -m benchmarks.stress_crawl_stats [--threads N] [--pages N]
+"""
+import sys
+import time
+from argparse import ArgumentParser
+from hashlib import sha256
+from threading import Thread, Barrier
+
+from utils.crawl_stats import CrawlStats
+
+
+def work(stats, barrier, thread_id, pages, accepted):
+    barrier.wait()
+    for i in range(pages):
+        # every thread sees the same words, only the page url differs
+        stats.record_page(f"https://www.ics.uci.edu/{thread_id}/{i}", i % 997,
+                          {"uci": 2, "ics": 1, f"t{thread_id}": 1})
+        for j in range(5):
+            pattern = f"pattern-{j}"
+            if stats.url_pattern_hits.increment_below(pattern, stats.max_url_pattern_hits):
+                accepted[thread_id][pattern] = accepted[thread_id].get(pattern, 0) + 1
+        stats.subdomain_hits.increment_below(f"sub{i % 7}", stats.max_subdomain_hits)
+        stats.seen_urls.add(sha256(f"url-{i}".encode()).digest())
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--pages", type=int, default=5000)
+    args = parser.parse_args()
+
+    stats = CrawlStats(max_url_pattern_hits=500, max_subdomain_hits=10000)
+    barrier = Barrier(args.threads)
+    accepted = [{} for _ in range(args.threads)]
+    threads = [Thread(target=work, args=(stats, barrier, t, args.pages, accepted))
+               for t in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    longest_url, longest_count, words = stats.snapshot()
+    words = dict(words)
+    total_pages = args.threads * args.pages
+    failures = []
+    if stats.pages != total_pages:
+        failures.append(f"pages {stats.pages} != {total_pages}")
+    if words.get("uci") != 2 * total_pages or words.get("ics") != total_pages:
+        failures.append(f"word totals uci={words.get('uci')} ics={words.get('ics')}")
+    if longest_count != 996:
+        failures.append(f"longest page {longest_count} != 996")
+    for j in range(5):
+        pattern = f"pattern-{j}"
+        taken = sum(a.get(pattern, 0) for a in accepted)
+        if taken != min(total_pages, stats.max_url_pattern_hits):
+            failures.append(f"{pattern} accepted {taken} times")
+    for sub, count in stats.subdomain_hits.items():
+        if count > stats.max_subdomain_hits:
+            failures.append(f"subdomain {sub} went over its limit ({count})")
+    if len(stats.seen_urls) != min(args.pages, total_pages):
+        failures.append(f"seen urls {len(stats.seen_urls)} != {args.pages}")
+
+    print(f"{args.threads} threads x {args.pages} pages in {elapsed:.2f}s "
+          f"({total_pages / elapsed:.0f} pages/sec)")
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("ok")
@@ -0,0 +1,143 @@
+"""
+Local stand-in for the course cache server: answers GET /?q=<url>&u=<agent>
+with the cbor encoded dict utils.download expects, holding a pickled
+RawResponse of the page a site object (see benchmarks.synthetic_site)
+returns for the url. make_download() gives the same replies in process,
+without HTTP.
+
+usage: python -m benchmarks.stub_cache_server [--port N] [--latency SECONDS] [--fail-rate R] [--site synthetic|DIR]
+"""
+import pickle
+import random
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cbor
+
+from benchmarks.corpus import RawResponse, synthetic_page
+from benchmarks.synthetic_site import RecordedSite, SyntheticSite
+from utils.response import Response
+
+
+class LinkGraphSite(object):
+    """every page links to other /p/<n> pages of its host, n below pages, so a crawl of it ends"""
+    seed_urls = ["https://www.ics.uci.edu"]
+
+    def __init__(self, pages=300, links=10, seed=121):
+        self.pages = pages
+        self.links = links
+        self.seed = seed
+
+    def fetch(self, url):
+        # the same url always gets the same page
+        rng = random.Random(f"{self.seed}{url}")
+        host = urlparse(url).hostname or "www.ics.uci.edu"
+        content = synthetic_page(rng, host, n_links=0)
+        links = "".join(f'<a href="/p/{rng.randrange(self.pages)}">more</a>' for _ in range(self.links))
+        return 200, content.replace(b"</body>", links.encode("utf-8") + b"</body>"), "page"
+
+
+def encode_reply(url, status, content):
+    """the cache server's reply body for a page"""
+    reply = {"url": url, "status": status}
+    if content is not None:
+        reply["response"] = pickle.dumps(RawResponse(url, content))
+    return cbor.dumps(reply)
+
+
+def make_download(site, kinds=None):
+    """
+    returns a stand-in for utils.download.download that serves site in
+    process, counting the pages served by kind in kinds if given
+    """
+    lock = threading.Lock()
+
+    def download(url, config, logger=None):
+        status, content, kind = site.fetch(url)
+        if kinds is not None:
+            with lock:
+                kinds[kind] += 1
+        return Response(cbor.loads(encode_reply(url, status, content)))
+    return download
+
+
+class StubCacheServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections under hundreds of clients
+    request_queue_size = 1024
+
+    def __init__(self, port=0, latency=0.0, fail_rate=0.0, site=None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.site = site if site is not None else LinkGraphSite()
+        self.requests = 0
+        self.failures = 0
+        # pages served by kind (page, trap, duplicate, missing)
+        self.kinds = Counter()
+        self.count_lock = threading.Lock()
+        super().__init__(("localhost", port), StubCacheHandler)
+
+    @property
+    def address(self):
+        return self.server_address[:2]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+class StubCacheHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, without this a kept-alive
+    # connection waits on delayed acks
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        url = query.get("q", [""])[0]
+        if server.latency:
+            time.sleep(server.latency)
+        failed = random.random() < server.fail_rate
+        if failed:
+            body = b"overloaded"
+            self.send_response(503)
+        else:
+            status, content, kind = server.site.fetch(url)
+            body = encode_reply(url, status, content)
+            self.send_response(200)
+        with server.count_lock:
+            server.requests += 1
+            server.failures += failed
+            if not failed:
+                server.kinds[kind] += 1
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client drops replies over its MAX_RESPONSE_BYTES unread
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--site", default="synthetic",
+                        help="synthetic, or a directory of saved pages laid out as <host>/<path>")
+    args = parser.parse_args()
+    site = SyntheticSite() if args.site == "synthetic" else RecordedSite(args.site)
+    server = StubCacheServer(args.port, args.latency, args.fail_rate, site)
+    print(f"seed urls: {','.join(site.seed_urls)}")
+    print(f"stub cache server on {server.address}")
+    server.serve_forever()
@@ -0,0 +1,204 @@
+"""
+Sites the stub cache server (benchmarks.stub_cache_server) can serve.
+
+SyntheticSite is a deterministic graph of department-like pages on the four
+crawled domains, with the things a real crawl runs into: calendar and search
+traps that never end, printable copies and mirrors of pages, dead links and
+a robots.txt.
+RecordedSite serves a directory of saved pages laid out like "wget --mirror"
+output (<host>/<path>).
+"""
+import os
+import random
+from datetime import date, timedelta
+from urllib.parse import urlparse, parse_qs
+
+HOSTS = ["www.ics.uci.edu", "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu"]
+SECTIONS = ["people", "research", "news", "courses", "labs", "about", "degrees", "seminars"]
+# frequent words every page shares, stopwords included as in real text
+COMMON_WORDS = (
+    "the of and to a in is for on that with as by this are be at from our "
+    "students research faculty university computer science data department "
+    "program information school graduate undergraduate learning systems"
+).split()
+# every host's robots.txt keeps crawlers out of the pages that moved away
+ROBOTS_TXT = b"User-agent: *\nDisallow: /old/\nDisallow: /wp-admin/\nAllow: /wp-admin/admin-ajax.php\n"
+SYLLABLES = ["ka", "to", "mi", "ra", "ne", "lo", "su", "vi", "de", "pa", "ri", "co",
+             "ma", "te", "ul", "an", "or", "is", "ex", "ber", "gen", "tal", "ric", "son"]
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def html_page(title, paragraphs, links, host):
+    """returns html bytes with the boilerplate of a department page"""
+    nav = "".join(f'<li><a href="/{section}">{section.title()}</a></li>' for section in SECTIONS)
+    body = "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    link_items = "".join(f'<li><a href="{href}">{text}</a></li>' for href, text in links)
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{title}</title>"
+        "<link rel='stylesheet' href='/css/site.css'>"
+        "<style>nav li { display: inline; }</style>"
+        "<script>window.analytics = window.analytics || []; analytics.push('pageview');</script>"
+        "</head><body>"
+        f"<header><a href='https://{host}/'>Donald Bren School</a><nav><ul>{nav}</ul></nav></header>"
+        f"<main><h1>{title}</h1>{body}<ul>{link_items}</ul></main>"
+        "<footer>University of California, Irvine. <a href='/about/contact'>Contact</a></footer>"
+        "</body></html>"
+    ).encode("utf-8")
+
+
+class SyntheticSite(object):
+    """
+    pages_per_host content pages per host, each linking to links_per_page
+    pages of its host, a few of other hosts, and with some probability to a
+    trap, a copy of itself or a dead link. Every url always gets the same page.
+
+    fetch(url) returns (status, html bytes, kind) where kind is one of
+    "page", "trap", "duplicate", "missing" or "robots".
+    """
+    def __init__(self, hosts=HOSTS, pages_per_host=250, links_per_page=15, words_per_page=500, seed=121):
+        self.hosts = list(hosts)
+        self.pages_per_host = pages_per_host
+        self.links_per_page = links_per_page
+        self.words_per_page = words_per_page
+        self.seed = seed
+        rng = random.Random(seed)
+        self.vocabulary = make_vocabulary(rng, 20000)
+        self.paths = dict()
+        self.page_ids = dict()
+        for host in self.hosts:
+            paths = []
+            for i in range(pages_per_host):
+                slug = "-".join(rng.sample(self.vocabulary, 2))
+                paths.append(f"/{rng.choice(SECTIONS)}/{slug}-{i}")
+            self.paths[host] = paths
+            self.page_ids.update(((host, path), i) for i, path in enumerate(paths))
+
+    @property
+    def seed_urls(self):
+        return [f"https://{host}" for host in self.hosts]
+
+    def _rng(self, *key):
+        return random.Random(":".join(str(part) for part in (self.seed,) + key))
+
+    def _text(self, rng, words):
+        # each page mostly talks about its own topic words, so pages differ
+        # the way real pages do instead of all sharing one distribution
+        topic = rng.sample(self.vocabulary, 80)
+        paragraphs = []
+        for _ in range(max(1, words // 50)):
+            paragraphs.append(" ".join(
+                rng.choice(COMMON_WORDS) if rng.random() < 0.35 else rng.choice(topic)
+                for _ in range(50)))
+        return paragraphs
+
+    def _page_links(self, rng, host, page_id):
+        paths = self.paths[host]
+        links = [(paths[i], "more") for i in rng.sample(range(len(paths)), min(self.links_per_page, len(paths)))]
+        for other in rng.sample(self.hosts, 2):
+            links.append((f"https://{other}{rng.choice(self.paths[other])}", "partner"))
+        own = paths[page_id]
+        if rng.random() < 0.2:
+            day = date(2015, 1, 1) + timedelta(days=rng.randrange(3000))
+            links.append((f"/archive/day/{day.year}/{day.month:02d}/{day.day:02d}", "archive"))
+        if rng.random() < 0.1:
+            links.append((f"/search?q={rng.choice(self.vocabulary)}&page=1", "search"))
+        if rng.random() < 0.3:
+            links.append((f"{own}?print=1", "print"))
+        if rng.random() < 0.1:
+            links.append((f"/mirror{own}", "mirror"))
+        if rng.random() < 0.2:
+            # the same page again, spelled differently
+            links.append((rng.choice([f"{own}?utm_source=newsletter", f"{own}/", f"{own}#top",
+                                      f"https://{host.removeprefix('www.')}{own}", f"/./{own.lstrip('/')}"]), "share"))
+        if rng.random() < 0.1:
+            links.append((f"/old/{rng.choice(self.vocabulary)}-{rng.randrange(10 ** 6)}", "old page"))
+        return links
+
+    def _content_page(self, host, page_id, footer=""):
+        rng = self._rng(host, page_id)
+        paragraphs = self._text(rng, self.words_per_page)
+        if footer:
+            paragraphs.append(footer)
+        title = self.paths[host][page_id].rsplit("/", 1)[-1].replace("-", " ").title()
+        return html_page(title, paragraphs, self._page_links(rng, host, page_id), host)
+
+    def _home(self, host):
+        rng = self._rng(host, "home")
+        links = [(path, "news") for path in self.paths[host][:30]]
+        links += [(f"https://{other}", other) for other in self.hosts if other != host]
+        return html_page("Home", self._text(rng, 300), links, host)
+
+    def _archive_day(self, host, year, month, day):
+        # a calendar without end, every day has the same thin content
+        current = date(year, month, day)
+        links = [(f"/archive/day/{d.year}/{d.month:02d}/{d.day:02d}", label)
+                 for d, label in ((current - timedelta(days=1), "previous"), (current + timedelta(days=1), "next"))]
+        text = [f"Archive for {current.isoformat()}.", "There are no posts for this day. " * 8]
+        return html_page(f"Archive {current.isoformat()}", text, links, host)
+
+    def _search(self, host, query, page):
+        # result pages without end, the same results whatever the page number
+        rng = self._rng(host, "search", query)
+        results = [(self.paths[host][i], "result") for i in rng.sample(range(self.pages_per_host), 10)]
+        results.append((f"/search?q={query}&page={page + 1}", "next page"))
+        text = [f"Search results for {query}, page {page}."] + self._text(rng, 100)
+        return html_page(f"Search {query}", text, results, host)
+
+    def fetch(self, url):
+        parsed = urlparse(url)
+        host = parsed.netloc.lower()
+        if host not in self.paths and f"www.{host}" in self.paths:
+            host = f"www.{host}"
+        path = parsed.path.rstrip("/")
+        query = parse_qs(parsed.query)
+        if host not in self.paths:
+            return 404, None, "missing"
+        if not path:
+            return 200, self._home(host), "page"
+        if path == "/robots.txt":
+            return 200, ROBOTS_TXT, "robots"
+        if (host, path) in self.page_ids:
+            page_id = self.page_ids[host, path]
+            kind = "duplicate" if "print" in query or "utm_source" in query or url != f"https://{host}{path}" else "page"
+            return 200, self._content_page(host, page_id), kind
+        if path.startswith("/mirror/") and (host, path[7:]) in self.page_ids:
+            page_id = self.page_ids[host, path[7:]]
+            return 200, self._content_page(host, page_id, "Mirrored copy."), "duplicate"
+        parts = path.split("/")
+        if path.startswith("/archive/day/") and len(parts) == 6:
+            try:
+                return 200, self._archive_day(host, int(parts[3]), int(parts[4]), int(parts[5])), "trap"
+            except ValueError:
+                pass
+        if path == "/search" and "q" in query:
+            page = int(query.get("page", ["1"])[0]) if query.get("page", ["1"])[0].isdigit() else 1
+            return 200, self._search(host, query["q"][0], page), "trap"
+        return 404, html_page("Not Found", ["The page you requested was not found."], [], host), "missing"
+
+
+class RecordedSite(object):
+    """
+    Serves saved pages from path/<host>/<url path>, trying the path itself,
+    with ".html" and as a directory with an index.html.
+    """
+    def __init__(self, path, seed_urls=None):
+        self.path = path
+        hosts = sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+        self.seed_urls = seed_urls or [f"https://{host}" for host in hosts]
+
+    def fetch(self, url):
+        parsed = urlparse(url)
+        base = os.path.join(self.path, parsed.netloc.lower(), parsed.path.strip("/"))
+        for candidate in (base, base + ".html", os.path.join(base, "index.html")):
+            # never serve files outside the recording
+            if os.path.isfile(candidate) and os.path.realpath(candidate).startswith(os.path.realpath(self.path)):
+                with open(candidate, "rb") as f:
+                    return 200, f.read(), "page"
+        return 404, None, "missing"
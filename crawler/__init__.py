@@ -1,12 +1,45 @@
 from utils import get_logger
-from crawler.frontier import Frontier
+import os
+from crawler.frontier import Frontier, LogFrontier
+from crawler.sqlite_frontier import SqliteFrontier
 from crawler.worker import Worker
+from crawler.async_worker import AsyncWorker
+from crawler.distributed import CrawlNode, PartitionedFrontier
+import scraper
+from utils import metrics
+
+# frontier used for each SAVE file extension in config.ini, shelve otherwise
+FRONTIER_BACKENDS = {
+    ".log": LogFrontier,
+    ".sqlite": SqliteFrontier,
+    ".db": SqliteFrontier,
+}
+
+def get_frontier_factory(config):
+    _, extension = os.path.splitext(config.save_file)
+    return FRONTIER_BACKENDS.get(extension, Frontier)
+
+# worker used for each MODE in config.ini
+WORKER_MODES = {
+    "threads": Worker,
+    "async": AsyncWorker,
+}
+
+def get_worker_factory(config):
+    return WORKER_MODES[config.mode]
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
         self.logger = get_logger("CRAWLER")
+        scraper.configure(config, restart)
+        self.metrics_exporter = metrics.configure(config)
         self.frontier = frontier_factory(config, restart)
+        # with NODES, this process crawls only its share of the hosts, see crawler/distributed.py
+        self.node = None
+        if config.nodes:
+            self.node = CrawlNode(config, self.frontier)
+            self.frontier = PartitionedFrontier(self.frontier, self.node)
         self.workers = list()
         self.worker_factory = worker_factory
 
@@ -24,3 +57,12 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        scraper.write_to_file()
+        if self.node is not None:
+            self.node.finish()
+        scraper.close()
+        self.metrics_exporter.close()
+        metrics.profiler.dump()
+        # frontiers passed in through frontier_factory may not need closing
+        if hasattr(self.frontier, "close"):
+            self.frontier.close()
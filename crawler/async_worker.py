@@ -0,0 +1,62 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import scraper
+from crawler.worker import Worker
+from utils.download import AsyncDownloader
+from utils.metrics import metrics
+
+
+class AsyncWorker(Worker):
+    """
+    Worker that keeps up to config.async_concurrency downloads in flight from
+    one thread. Frontier.get_tbd_url blocks, so a feeder calls it on a helper
+    thread and hands the urls to fetch tasks through a bounded queue; the
+    tasks download them and process the pages on the event loop.
+    """
+    def run(self):
+        asyncio.run(self.crawl())
+
+    async def crawl(self):
+        loop = asyncio.get_running_loop()
+        concurrency = self.config.async_concurrency
+        queue = asyncio.Queue(concurrency)
+        async with AsyncDownloader(self.config, self.logger) as downloader:
+            fetchers = [asyncio.create_task(self.fetch(downloader, queue)) for _ in range(concurrency)]
+            with ThreadPoolExecutor(1) as feeder:
+                while True:
+                    # returns None once nothing is queued or in flight, including here
+                    tbd_url = await loop.run_in_executor(feeder, self.next_url)
+                    if not tbd_url:
+                        self.logger.info("Frontier is empty. Stopping Crawler.")
+                        break
+                    await queue.put(tbd_url)
+            for _ in fetchers:
+                await queue.put(None)
+            await asyncio.gather(*fetchers)
+
+    async def fetch(self, downloader, queue):
+        while True:
+            tbd_url = await queue.get()
+            if tbd_url is None:
+                return
+            try:
+                if self.skip_quarantined(tbd_url):
+                    continue
+                with metrics.timer("download"):
+                    resp = await downloader.download(tbd_url)
+                if scraper.parse_pool is None:
+                    self.process(tbd_url, resp)
+                    continue
+                # the loop keeps downloading while a parser process works on the page
+                self.log_download(tbd_url, resp)
+                metrics.count("responses", str(resp.status))
+                scraper.archive_response(tbd_url, resp)
+                result = scraper.cached_result(tbd_url, resp)
+                if result is None:
+                    with metrics.timer("parse_pool"):
+                        result = await scraper.parse_pool.analyze_async(tbd_url, resp)
+                    scraper.cache_result(tbd_url, resp, result)
+                self.add_links(tbd_url, scraper.record_result(tbd_url, result), result)
+            except Exception as e:
+                self.failed(tbd_url, e)
@@ -0,0 +1,384 @@
+import json
+import threading
+import time
+from hashlib import blake2b
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from urllib.parse import urlsplit
+
+import scraper
+from crawler.worker import filter_links, write_count_stats
+from utils import get_logger
+from utils.config import node_file
+from utils.crawl_stats import write_atomic
+from utils.metrics import metrics
+
+# seconds a node keeps trying to reach a peer that is not listening yet
+CONNECT_SECONDS = 60.0
+# seconds node 0 waits for the statistics of the other nodes at the end
+STATS_SECONDS = 60.0
+# the files every node keeps for itself
+NODE_FILES = ["save_file", "stats_file", "page_cache", "archive", "metrics_file", "profile_file"]
+
+
+def host_partition(host, nodes):
+    """the node that owns host; "www." and non-www copies of a host share one"""
+    host = (host or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return int.from_bytes(blake2b(host.encode("utf-8"), digest_size=8).digest(), "big") % nodes
+
+
+def url_partition(url, nodes):
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        host = None
+    return host_partition(host, nodes)
+
+
+def node_config(config, node_id):
+    """
+    Makes config the config of node node_id of NODES: it starts from the
+    seeds of its own hosts, and its files get the node id in their name so
+    several nodes can run in one directory.
+    """
+    assert 0 <= node_id < len(config.nodes), f"--node should be below the {len(config.nodes)} NODES"
+    config.node_id = node_id
+    # node 0 writes the statistics of the whole crawl here at the end
+    config.merged_stats_file = config.stats_file
+    for name in NODE_FILES:
+        setattr(config, name, node_file(getattr(config, name), node_id))
+    if config.metrics_port:
+        config.metrics_port += node_id
+    config.seed_urls = [url for url in config.seed_urls if url_partition(url, len(config.nodes)) == node_id]
+    return config
+
+
+class CrawlNode(object):
+    """
+    One process of a distributed crawl. The url space is split by host
+    (host_partition) over the NODES addresses; this node crawls the hosts it
+    owns with its own frontier, so politeness stays local, and sends the
+    links it finds to other nodes' hosts to their owner. Links are buffered
+    per node and sent in batches of forward_batch urls, or every
+    forward_seconds, over multiprocessing.connection.
+
+    Node 0 also decides when the crawl is over: every node reports every
+    forward_seconds whether it is idle (nothing queued, downloading or
+    buffered) and how many urls it sent and received. The crawl ends after
+    two consecutive rounds of reports with every node idle, as many urls
+    received as sent, and the same counts, so no batch can still be on its
+    way. The other nodes then send node 0 their statistics to merge.
+    """
+    def __init__(self, config, frontier):
+        self.config = config
+        self.node_id = config.node_id
+        self.addresses = config.nodes
+        self.nodes = len(self.addresses)
+        self.frontier = frontier
+        self.logger = get_logger(f"NODE-{self.node_id}", "Node")
+        self.authkey = config.user_agent.encode("utf-8")
+        self.counts_stats_file = node_file("count_stats.txt", self.node_id)
+
+        self.lock = threading.Lock()
+        # workers with nothing to download wait here for urls from other nodes
+        self.work = threading.Condition(self.lock)
+        self.stopped = threading.Event()
+        # node -> [(parent, urls)] not sent yet, and the number of urls in them
+        self.outboxes = {node: [] for node in range(self.nodes) if node != self.node_id}
+        self.outbox_urls = dict.fromkeys(self.outboxes, 0)
+        self.connections = dict()
+        self.send_locks = {node: threading.Lock() for node in self.outboxes}
+        self.sent = 0
+        self.received = 0
+
+        # node 0: the last report of every node, the nodes that reported
+        # since the last round and the counts of that round
+        self.reports = dict()
+        self.reported = set()
+        self.last_round = None
+        self.node_stats = dict()
+        self.stats_arrived = threading.Condition()
+
+        self.listener = Listener(self.addresses[self.node_id], authkey=self.authkey)
+        threading.Thread(target=self._accept, name="NodeListener", daemon=True).start()
+        threading.Thread(target=self._tick, name="NodeTicker", daemon=True).start()
+
+    def _connection(self, node):
+        # caller holds send_locks[node]
+        connection = self.connections.get(node)
+        if connection is None:
+            deadline = time.monotonic() + CONNECT_SECONDS
+            while True:
+                try:
+                    connection = Client(self.addresses[node], authkey=self.authkey)
+                    break
+                except OSError:
+                    # the other node may not be listening yet
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.2)
+            self.connections[node] = connection
+        return connection
+
+    def _send(self, node, message):
+        with self.send_locks[node]:
+            try:
+                self._connection(node).send(message)
+            except (OSError, EOFError):
+                # one reconnect, a peer that restarted has a new listener
+                self.connections.pop(node, None)
+                self._connection(node).send(message)
+
+    def forward(self, urls, parent=None):
+        """
+        Buffers the urls other nodes own for them and returns the ones this
+        node owns. parent is the scraper.PageResult the urls were found on.
+        """
+        local = []
+        remote = dict()
+        for url in urls:
+            node = url_partition(url, self.nodes)
+            if node == self.node_id:
+                local.append(url)
+            else:
+                remote.setdefault(node, []).append(url)
+        if remote:
+            # the frontier scores urls by the page's word count only
+            parent = parent._replace(word_freqs={}, links=()) if parent is not None else None
+            full = []
+            with self.lock:
+                for node, node_urls in remote.items():
+                    self.outboxes[node].append((parent, node_urls))
+                    self.outbox_urls[node] += len(node_urls)
+                    if self.outbox_urls[node] >= self.config.forward_batch:
+                        full.append(node)
+            for node in full:
+                self._flush(node)
+            metrics.count("links_forwarded", amount=len(urls) - len(local))
+        return local
+
+    def _flush(self, node):
+        with self.lock:
+            batch = self.outboxes[node]
+            if not batch:
+                return
+            self.outboxes[node] = []
+            # counted as sent while on its way, so no report sees the urls nowhere
+            count = self.outbox_urls[node]
+            self.sent += count
+            self.outbox_urls[node] = 0
+        try:
+            self._send(node, ("urls", batch))
+        except (OSError, EOFError):
+            # back in the outbox, the next flush sends it again
+            with self.lock:
+                self.outboxes[node] = batch + self.outboxes[node]
+                self.outbox_urls[node] += count
+                self.sent -= count
+            raise
+
+    def _accept(self):
+        # runs until close(), the other nodes send their statistics after the stop
+        while True:
+            try:
+                connection = self.listener.accept()
+            except AuthenticationError:
+                # not a node of this crawl
+                continue
+            except OSError:
+                # the listener was closed
+                return
+            threading.Thread(target=self._receive, args=(connection,), name="NodeReceiver", daemon=True).start()
+
+    def _receive(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    self._handle(message)
+                except Exception as e:
+                    self.logger.error(f"Failed to handle {message[0]}: {type(e).__name__}: {e}")
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == "urls":
+            count = 0
+            for parent, urls in message[1]:
+                count += len(urls)
+                # this node owns their hosts, so its limits and seen urls decide
+                new_urls, fingerprints = filter_links(
+                    urls, scraper.crawl_stats, scraper.trap_detector, self._write_count_stats)
+                if new_urls:
+                    self.frontier.add_urls(new_urls, fingerprints, parent)
+            # counted once the urls are queued, an idle report cannot miss them
+            with self.lock:
+                self.received += count
+                self.work.notify_all()
+        elif kind == "report":
+            _, node, report = message
+            self._record_report(node, report)
+        elif kind == "stop":
+            self._stop()
+        elif kind == "stats":
+            _, node, stats = message
+            with self.stats_arrived:
+                self.node_stats[node] = stats
+                self.stats_arrived.notify_all()
+
+    def _write_count_stats(self):
+        write_count_stats(self.counts_stats_file, scraper.crawl_stats)
+
+    def _report(self):
+        # (idle, sent, received); the counts are read before the frontier
+        with self.lock:
+            sent, received = self.sent, self.received
+            buffered = any(self.outboxes.values())
+        with self.frontier.lock:
+            idle = not buffered and not self.frontier.in_flight and not self.frontier.pending_count()
+        return idle, sent, received
+
+    def _tick(self):
+        while not self.stopped.wait(self.config.forward_seconds):
+            try:
+                for node in self.outboxes:
+                    self._flush(node)
+                report = self._report()
+                if self.node_id == 0:
+                    self._record_report(0, report)
+                else:
+                    self._send(0, ("report", self.node_id, report))
+            except (OSError, EOFError) as e:
+                self.logger.error(f"Lost a connection: {type(e).__name__}: {e}")
+
+    def _record_report(self, node, report):
+        with self.lock:
+            self.reports[node] = report
+            self.reported.add(node)
+            if len(self.reported) < self.nodes:
+                return
+            # a round: every node reported since the last one
+            self.reported.clear()
+            current = tuple(self.reports[node] for node in range(self.nodes))
+            quiet = (all(idle for idle, _, _ in current)
+                     and sum(sent for _, sent, _ in current) == sum(received for _, _, received in current))
+            done = quiet and current == self.last_round and not self.stopped.is_set()
+            self.last_round = current if quiet else None
+        if done:
+            self.logger.info("Every node is idle. Stopping the crawl.")
+            for other in self.outboxes:
+                self._send(other, ("stop",))
+            self._stop()
+
+    def _stop(self):
+        with self.lock:
+            self.stopped.set()
+            self.work.notify_all()
+
+    def wait_for_work(self):
+        """blocks until urls arrive from another node; False once the crawl is over"""
+        with self.lock:
+            if not self.stopped.is_set():
+                self.work.wait(self.config.forward_seconds)
+            return not self.stopped.is_set()
+
+    def _local_stats(self):
+        stats = scraper.crawl_stats
+        stats.merge_all()
+        with stats.lock:
+            return {
+                "pages": stats.pages,
+                "longest_page_url": stats.longest_page_url,
+                "longest_page_word_count": stats.longest_page_word_count,
+                "word_counts": dict(stats.most_common_words.counts),
+                "num_urls": len(stats.seen_urls),
+                "subdomain_count": dict(stats.subdomain_hits.items()),
+            }
+
+    def finish(self):
+        """
+        Called once the workers stopped. Node 0 merges the other nodes'
+        statistics into its own and writes the statistics of the whole crawl
+        to STATS_FILE and count_stats.txt; the others send theirs to node 0.
+        """
+        if self.node_id != 0:
+            self._send(0, ("stats", self.node_id, self._local_stats()))
+            self.close()
+            return
+        with self.stats_arrived:
+            self.stats_arrived.wait_for(lambda: len(self.node_stats) == self.nodes - 1, STATS_SECONDS)
+            node_stats = dict(self.node_stats)
+        if len(node_stats) < self.nodes - 1:
+            self.logger.error(f"Only {len(node_stats)} of {self.nodes - 1} nodes sent their statistics.")
+        merged = self._local_stats()
+        stats = scraper.crawl_stats
+        for other in node_stats.values():
+            with stats.lock:
+                stats.pages += other["pages"]
+                if other["longest_page_word_count"] > stats.longest_page_word_count:
+                    stats.longest_page_word_count = other["longest_page_word_count"]
+                    stats.longest_page_url = other["longest_page_url"]
+                stats.most_common_words.update(other["word_counts"])
+            merged["num_urls"] += other["num_urls"]
+            for subdomain, count in other["subdomain_count"].items():
+                merged["subdomain_count"][subdomain] = merged["subdomain_count"].get(subdomain, 0) + count
+        write_atomic(self.config.merged_stats_file, scraper.render_stats())
+        write_atomic("count_stats.txt", json.dumps(
+            {"num_urls": merged["num_urls"], "subdomain_count": merged["subdomain_count"]}, indent=4))
+        self.logger.info(f"Merged the statistics of {len(node_stats) + 1} nodes, {stats.pages} pages.")
+        self.close()
+
+    def close(self):
+        self.stopped.set()
+        self.listener.close()
+        for node, connection in list(self.connections.items()):
+            with self.send_locks[node]:
+                connection.close()
+
+
+class PartitionedFrontier(object):
+    """
+    The frontier a distributed crawl's workers use: this node's own frontier,
+    whose get_tbd_url waits for urls from other nodes instead of ending the
+    crawl when it runs out, until node 0 stops the crawl.
+    """
+    def __init__(self, frontier, node):
+        self.frontier = frontier
+        self.node = node
+
+    def get_tbd_url(self):
+        while True:
+            url = self.frontier.get_tbd_url()
+            if url is not None:
+                return url
+            if not self.node.wait_for_work():
+                return None
+
+    def forward_remote(self, urls, parent=None):
+        """sends the urls other nodes own to them, returns the others"""
+        return self.node.forward(urls, parent)
+
+    def add_url(self, url, fingerprint=None):
+        self.frontier.add_url(url, fingerprint)
+
+    def add_urls(self, urls, fingerprints=None, parent=None):
+        self.frontier.add_urls(urls, fingerprints, parent)
+
+    def mark_complete_and_add(self, url, links, fingerprints=None, parent=None):
+        self.frontier.mark_complete_and_add(url, links, fingerprints, parent)
+
+    def mark_url_complete(self, url):
+        self.frontier.mark_url_complete(url)
+
+    def mark_url_failed(self, url):
+        self.frontier.mark_url_failed(url)
+
+    def pending_count(self):
+        return self.frontier.pending_count()
+
+    def close(self):
+        self.frontier.close()
@@ -1,17 +1,50 @@
 import os
 import shelve
+import time
 
-from threading import Thread, RLock
+from collections import Counter
+from heapq import heappush, heappop
+from itertools import count
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from utils import get_logger
+from utils.canonical_url import canonicalize, url_fingerprint, FINGERPRINT_SIZE
+from scraper import is_valid, robots_crawl_delay, crawl_stats
+from crawler.log_store import LogStore
+from crawler.scoring import get_scorer
+
+
+def politeness_host(url):
+    # the key politeness is kept under, "www." and non-www copies of a host are one server
+    return urlparse(url).netloc.lower().removeprefix("www.")
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
+        # urls waiting to be downloaded, one heap per host ordered by the
+        # scorer (crawler/scoring.py), newest first among equal scores. A host
+        # with pending urls sits in host_heap keyed on the time it may be
+        # fetched from again, so politeness is kept per host instead of per worker.
+        # A host is out of the heap while one of its urls is downloaded
+        # (busy_hosts), its delay counts from the end of that download.
+        self.scorer = get_scorer(config)
+        self.sequence = count()
+        self.host_queues = dict()
+        self.host_heap = list()
+        self.scheduled_hosts = set()
+        self.busy_hosts = set()
+        self.host_next_fetch = dict()
+        self.host_fetches = Counter()
+        self.in_flight = 0
+        # digests of every url discovered, one set shared with the workers
+        # (SEEN_SET), which drop the links in it before they reach the
+        # frontier; the save file decides what is new
+        self.seen = crawl_stats.seen_urls
+        self.lock = RLock()
+        self.ready = Condition(self.lock)
         
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
@@ -24,7 +57,7 @@ class Frontier(object):
                 f"Found save file {self.config.save_file}, deleting it.")
             os.remove(self.config.save_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = self._open_save_file()
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
@@ -35,38 +68,211 @@ class Frontier(object):
                 for url in self.config.seed_urls:
                     self.add_url(url)
 
+    def _open_save_file(self):
+        ''' This function can be overridden for alternate saving techniques. '''
+        return shelve.open(self.config.save_file)
+
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
+        total_count = 0
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        with self.lock:
+            self._migrate_keys()
+            for urlhash, (url, completed) in self.save.items():
+                if len(urlhash) != 2 * FINGERPRINT_SIZE:
+                    continue
+                total_count += 1
+                self.seen.add(bytes.fromhex(urlhash))
+                if not completed and is_valid(url):
+                    self._enqueue(url, self._score(url, None))
+                    tbd_count += 1
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
-    def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
+    def _migrate_keys(self):
+        # save files of older versions keyed urls by a sha256 of the url as
+        # found; they are saved again under their canonical url's fingerprint
+        # and the old key is deleted, so a save file is migrated once
+        legacy = [urlhash for urlhash in self.save.keys() if len(urlhash) != 2 * FINGERPRINT_SIZE]
+        for legacy_hash in legacy:
+            url, completed = self.save[legacy_hash]
+            url = canonicalize(url)
+            urlhash = url_fingerprint(url).hex()
+            if urlhash in self.save:
+                completed = completed or self.save[urlhash][1]
+            self.save[urlhash] = (url, completed)
+            del self.save[legacy_hash]
+        if legacy:
+            self.save.sync()
+
+    def _score(self, url, parent):
+        # parent: the scraper.PageResult of the page url was found on, if any
+        parsed = urlparse(url)
+        depth = len([segment for segment in parsed.path.split('/') if segment])
+        return self.scorer.score(url, depth, parent, self.host_fetches[politeness_host(url)])
+
+    def _enqueue(self, url, score=0.0):
+        host = politeness_host(url)
+        heappush(self.host_queues.setdefault(host, list()), (-score, -next(self.sequence), url))
+        if host not in self.scheduled_hosts:
+            self._schedule(host)
+
+    def _dequeue(self, host):
+        queue = self.host_queues.get(host)
+        if not queue:
             return None
+        _, _, url = heappop(queue)
+        if not queue:
+            del self.host_queues[host]
+        return url
 
-    def add_url(self, url):
-        url = normalize(url)
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
-    def mark_url_complete(self, url):
-        urlhash = get_urlhash(url)
+    def _has_pending(self, host):
+        return host in self.host_queues
+
+    def _schedule(self, host):
+        if host in self.busy_hosts:
+            # scheduled again once its download is done, see _release
+            return
+        ready_at = max(time.monotonic(), self.host_next_fetch.get(host, 0))
+        heappush(self.host_heap, (ready_at, host))
+        self.scheduled_hosts.add(host)
+        self.ready.notify()
+
+    def host_delay(self, host):
+        # seconds to wait between two downloads from host, longer if its robots.txt
+        # asks; robots.txt is cached per netloc, so both spellings of host are read
+        return max(self.config.time_delay, robots_crawl_delay(host) or 0,
+                   robots_crawl_delay(f"www.{host}") or 0)
+
+    def get_tbd_url(self):
+        """
+        Returns the next url whose host may be fetched from now, waiting for a
+        host to become ready if needed. Returns None once nothing is queued and
+        no other worker is still downloading (and so could add more urls).
+        """
+        with self.lock:
+            while True:
+                if self.host_heap:
+                    ready_at, host = self.host_heap[0]
+                    now = time.monotonic()
+                    if ready_at > now:
+                        self.ready.wait(ready_at - now)
+                        continue
+                    heappop(self.host_heap)
+                    self.scheduled_hosts.discard(host)
+                    url = self._dequeue(host)
+                    if url is None:
+                        continue
+                    self.busy_hosts.add(host)
+                    self.host_fetches[host] += 1
+                    self.in_flight += 1
+                    return url
+                if not self.in_flight:
+                    # wake the other workers so they can stop as well
+                    self.ready.notify_all()
+                    return None
+                self.ready.wait()
+
+    def add_url(self, url, fingerprint=None):
+        # fingerprint: url_fingerprint(url) of an url that is canonical already
+        self.add_urls([url], None if fingerprint is None else [fingerprint])
+
+    def add_urls(self, urls, fingerprints=None, parent=None):
+        '''
+        Adds many urls with one write to the save file. fingerprints, if
+        given, are the url_fingerprint()s of urls that are canonical already.
+        parent is the scraper.PageResult of the page they were found on.
+        '''
+        entries = self._entries(urls, fingerprints)
+        with self.lock:
+            self._add_entries(entries, parent)
+            self._sync()
+
+    def mark_complete_and_add(self, url, links, fingerprints=None, parent=None):
+        '''
+        Marks url complete and adds the links found on it in one write, so
+        a save file never has the page completed without its links.
+        '''
+        entries = self._entries(links, fingerprints)
+        with self.lock:
+            # the links are written before the completion that depends on them
+            self._add_entries(entries, parent)
+            self._complete(url)
+            self._sync()
+            self._release(url)
+
+    def _entries(self, urls, fingerprints):
+        # fingerprint -> canonical url, copies of a url are added once
+        if fingerprints is None:
+            urls = [canonicalize(url) for url in urls]
+            fingerprints = [url_fingerprint(url) for url in urls]
+        entries = dict()
+        for fingerprint, url in zip(fingerprints, urls):
+            entries.setdefault(fingerprint, url)
+        return entries
+
+    def _add_entries(self, entries, parent=None):
+        new_urls = []
+        for fingerprint, url in entries.items():
+            urlhash = fingerprint.hex()
+            if urlhash not in self.save:
+                self.seen.add(fingerprint)
+                self.save[urlhash] = (url, False)
+                new_urls.append(url)
+        for url in new_urls:
+            self._enqueue(url, self._score(url, parent))
+
+    def _complete(self, url):
+        urlhash = url_fingerprint(url).hex()
         if urlhash not in self.save:
             # This should not happen.
             self.logger.error(
                 f"Completed url {url}, but have not seen it before.")
-
         self.save[urlhash] = (url, True)
+
+    def _sync(self):
         self.save.sync()
+
+    def mark_url_complete(self, url):
+        with self.lock:
+            self._complete(url)
+            self._sync()
+            self._release(url)
+
+    def mark_url_failed(self, url):
+        # the url stays incomplete in the save file and is retried on restart
+        with self.lock:
+            self._release(url)
+
+    def _release(self, url):
+        # url's download is over, its host may be fetched from again after its delay
+        host = politeness_host(url)
+        self.busy_hosts.discard(host)
+        self.host_next_fetch[host] = time.monotonic() + self.host_delay(host)
+        if self._has_pending(host) and host not in self.scheduled_hosts:
+            self._schedule(host)
+        self.in_flight -= 1
+        self.ready.notify_all()
+
+    def pending_count(self):
+        # urls waiting to be downloaded, for monitoring
+        with self.lock:
+            return sum(len(queue) for queue in self.host_queues.values())
+
+    def close(self):
+        with self.lock:
+            self.save.close()
+
+
+class LogFrontier(Frontier):
+    '''
+    Frontier saved as an append-only log (see crawler/log_store.py) instead of
+    a shelve, so discovering a url no longer costs a dbm write and fsync.
+    '''
+    def _open_save_file(self):
+        return LogStore(self.config.save_file)
+
+    def _migrate_keys(self):
+        # log save files only ever held fingerprint keys
+        pass
@@ -0,0 +1,142 @@
+import os
+import time
+
+from threading import Thread, RLock, Event
+
+
+class LogStore(object):
+    """
+    Frontier save file kept as an append-only log of
+    "urlhash<TAB>completed<TAB>url" lines, with the latest record for each
+    urlhash held in memory. It offers the part of the shelve interface the
+    Frontier uses.
+
+    Writes are group committed: sync() only writes and fsyncs once batch_size
+    records are pending or batch_seconds have passed, and a background thread
+    commits whatever is left every batch_seconds. The same thread rewrites the
+    log with only the live records once it holds compact_ratio times more
+    lines than urls.
+    """
+    def __init__(self, path, batch_size=512, batch_seconds=1.0, compact_ratio=3, compact_min=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+
+        self.lock = RLock()
+        self.records = dict()
+        self.pending = list()
+        # records written while a compaction snapshot is being copied
+        self.compaction_tail = None
+        self.log_lines = 0
+        self.last_commit = time.monotonic()
+
+        self._replay()
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.closed = Event()
+        self.committer = Thread(target=self._run, daemon=True)
+        self.committer.start()
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        # byte offset after the last complete line
+        end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                # a crash can leave a torn last line behind
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                parts = line[:-1].decode("utf-8").split("\t", 2)
+                if len(parts) != 3:
+                    continue
+                urlhash, completed, url = parts
+                self.records[urlhash] = (url, completed == "1")
+                self.log_lines += 1
+        # the torn line is dropped, or the next record would be appended to it
+        if os.path.getsize(self.path) > end:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+
+    def __contains__(self, urlhash):
+        return urlhash in self.records
+
+    def __getitem__(self, urlhash):
+        return self.records[urlhash]
+
+    def __setitem__(self, urlhash, value):
+        url, completed = value
+        with self.lock:
+            self.records[urlhash] = (url, completed)
+            line = f"{urlhash}\t{int(bool(completed))}\t{url}\n"
+            self.pending.append(line)
+            if self.compaction_tail is not None:
+                self.compaction_tail.append(line)
+
+    def __len__(self):
+        return len(self.records)
+
+    def values(self):
+        return list(self.records.values())
+
+    def items(self):
+        return list(self.records.items())
+
+    def sync(self):
+        """commits pending records once the batch is full or old enough"""
+        with self.lock:
+            if (len(self.pending) >= self.batch_size
+                    or time.monotonic() - self.last_commit >= self.batch_seconds):
+                self.commit()
+
+    def commit(self):
+        """writes and fsyncs every pending record now"""
+        with self.lock:
+            self.last_commit = time.monotonic()
+            if not self.pending:
+                return
+            self.file.write("".join(self.pending))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.log_lines += len(self.pending)
+            self.pending = list()
+
+    def _run(self):
+        while not self.closed.wait(self.batch_seconds):
+            self.commit()
+            if self.log_lines > max(self.compact_min, self.compact_ratio * len(self.records)):
+                self.compact()
+
+    def compact(self):
+        """rewrites the log with only the latest record of every url"""
+        with self.lock:
+            self.commit()
+            snapshot = list(self.records.items())
+            self.compaction_tail = list()
+
+        # the snapshot is copied without holding the lock, records written in
+        # the meantime are collected in compaction_tail
+        tmp_path = f"{self.path}.compact"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for urlhash, (url, completed) in snapshot:
+                f.write(f"{urlhash}\t{int(completed)}\t{url}\n")
+            with self.lock:
+                f.write("".join(self.compaction_tail))
+                f.flush()
+                os.fsync(f.fileno())
+                self.log_lines = len(snapshot) + len(self.compaction_tail)
+                self.compaction_tail = None
+                # everything still pending was just written as part of the tail
+                self.pending = list()
+                self.file.close()
+                os.replace(tmp_path, self.path)
+                self.file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self.closed.set()
+        self.committer.join()
+        with self.lock:
+            self.commit()
+            self.file.close()
@@ -0,0 +1,57 @@
+from math import log10
+
+import scraper
+from utils.url_pattern_detection import get_url_pattern_hash
+
+
+class LifoScorer(object):
+    '''
+    Every url scores the same, so each host's most recently found url is
+    downloaded first, as with the frontier's original stack.
+    '''
+    def score(self, url, depth, parent, host_fetches):
+        return 0.0
+
+
+class DepthScorer(object):
+    ''' Shallow urls first, the newest first among equally deep ones. '''
+    def score(self, url, depth, parent, host_fetches):
+        return -depth
+
+
+class YieldScorer(object):
+    '''
+    Favors urls that are likely to be new useful pages: shallow ones, found
+    on pages with a lot of text, on hosts little was downloaded from yet, and
+    of url patterns whose pages so far were mostly new content (the trap
+    detector's distinct ratio; copies and calendars of one pattern repeat).
+
+    Each input is weighted, counts are taken on a log scale.
+    '''
+    def __init__(self, depth_weight=1.0, parent_weight=1.0, host_weight=0.5, pattern_weight=1.0):
+        self.depth_weight = depth_weight
+        self.parent_weight = parent_weight
+        self.host_weight = host_weight
+        self.pattern_weight = pattern_weight
+
+    def score(self, url, depth, parent, host_fetches):
+        parent_words = parent.word_count if parent is not None else 0
+        # a pattern nothing was fetched of yet gets the benefit of the doubt
+        pattern = scraper.trap_detector.patterns.get(get_url_pattern_hash(url))
+        pattern_yield = pattern.distinct_ratio() if pattern is not None else 1.0
+        return (self.parent_weight * log10(1 + parent_words)
+                - self.depth_weight * depth
+                - self.host_weight * log10(1 + host_fetches)
+                + self.pattern_weight * pattern_yield)
+
+
+# scorer used for each FRONTIER_SCORER in config.ini
+SCORERS = {
+    "lifo": LifoScorer,
+    "depth": DepthScorer,
+    "yield": YieldScorer,
+}
+
+
+def get_scorer(config):
+    return SCORERS[config.frontier_scorer]()
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import time
+
+from urllib.parse import urlparse
+
+from crawler.frontier import Frontier, politeness_host
+from utils.canonical_url import url_fingerprint
+from scraper import is_valid
+
+# url states
+PENDING, DOWNLOADING, COMPLETE = 0, 1, 2
+# urlhashes per "IN (...)" query, below SQLite's limit on query parameters
+QUERY_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    urlhash TEXT PRIMARY KEY,  -- url_fingerprint(url).hex() of the canonical url
+    url TEXT NOT NULL,
+    host TEXT NOT NULL,        -- politeness_host(url)
+    depth INTEGER NOT NULL,
+    discovered REAL NOT NULL,
+    priority REAL NOT NULL,
+    state INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_by_host ON urls (host, state, priority);
+"""
+
+
+class SqliteFrontier(Frontier):
+    '''
+    Frontier kept in an indexed SQLite table instead of a shelve plus an
+    in-memory list. Pending urls stay on disk: only the hosts with pending
+    urls are held in memory, and get_tbd_url asks the index for the highest
+    priority url (the scorer's score) of the host that is ready first.
+
+    Writes are batched into one transaction that is committed every
+    batch_size writes or batch_seconds, with the database in WAL mode.
+    '''
+    def __init__(self, config, restart, batch_size=500, batch_seconds=1.0):
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+        if restart:
+            # a leftover write-ahead log must not be replayed into a new database
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(config.save_file + suffix):
+                    os.remove(config.save_file + suffix)
+        super().__init__(config, restart)
+
+    def _open_save_file(self):
+        db = sqlite3.connect(
+            self.config.save_file, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        db.execute("BEGIN")
+        return db
+
+    def _sync(self):
+        if (self.uncommitted >= self.batch_size
+                or time.monotonic() - self.last_commit >= self.batch_seconds):
+            self.save.execute("COMMIT")
+            self.save.execute("BEGIN")
+            self.uncommitted = 0
+            self.last_commit = time.monotonic()
+
+    def _parse_save_file(self):
+        with self.lock:
+            # urls that were being downloaded when the crawler stopped
+            self.save.execute(
+                "UPDATE urls SET state = ? WHERE state = ?", (PENDING, DOWNLOADING))
+            total_count, = self.save.execute("SELECT COUNT(*) FROM urls").fetchone()
+            tbd_count, = self.save.execute(
+                "SELECT COUNT(*) FROM urls WHERE state = ?", (PENDING,)).fetchone()
+            for host, in self.save.execute(
+                    "SELECT DISTINCT host FROM urls WHERE state = ?", (PENDING,)).fetchall():
+                self._schedule(host)
+            if not total_count:
+                # Frontier.__init__ only seeds when the save is empty, which a
+                # database connection never is
+                for url in self.config.seed_urls:
+                    self.add_url(url)
+        self.logger.info(
+            f"Found {tbd_count} urls to be downloaded from {total_count} "
+            f"total urls discovered.")
+
+    def _dequeue(self, host):
+        while True:
+            row = self.save.execute(
+                "SELECT urlhash, url FROM urls WHERE host = ? AND state = ? "
+                "ORDER BY priority DESC, rowid DESC LIMIT 1", (host, PENDING)).fetchone()
+            if row is None:
+                return None
+            urlhash, url = row
+            # the rules may have changed since the url was saved; only cached
+            # robots.txt rules are read, every worker waits on the lock held here
+            valid = is_valid(url, fetch_robots=False)
+            self.save.execute(
+                "UPDATE urls SET state = ? WHERE urlhash = ?",
+                (DOWNLOADING if valid else COMPLETE, urlhash))
+            self.uncommitted += 1
+            if valid:
+                return url
+
+    def _has_pending(self, host):
+        return self.save.execute(
+            "SELECT 1 FROM urls WHERE host = ? AND state = ? LIMIT 1",
+            (host, PENDING)).fetchone() is not None
+
+    def _add_entries(self, entries, parent=None):
+        hashes = {fingerprint.hex(): url for fingerprint, url in entries.items()}
+        # marked seen for the workers (seeds included); the urls of a resumed
+        # crawl are not loaded into the set, the table answers for them
+        for fingerprint in entries:
+            self.seen.add(fingerprint)
+        # one lookup for the urls already in the table
+        known = set()
+        keys = list(hashes)
+        for start in range(0, len(keys), QUERY_BATCH):
+            batch = keys[start:start + QUERY_BATCH]
+            known.update(urlhash for urlhash, in self.save.execute(
+                f"SELECT urlhash FROM urls WHERE urlhash IN ({','.join('?' * len(batch))})", batch))
+        rows = []
+        now = time.time()
+        for urlhash, url in hashes.items():
+            if urlhash in known:
+                continue
+            parsed = urlparse(url)
+            depth = len([segment for segment in parsed.path.split('/') if segment])
+            host = politeness_host(url)
+            priority = self.scorer.score(url, depth, parent, self.host_fetches[host])
+            rows.append((urlhash, url, host, depth, now, priority, PENDING))
+        if not rows:
+            return
+        self.save.executemany("INSERT OR IGNORE INTO urls VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.uncommitted += len(rows)
+        for host in {row[2] for row in rows}:
+            if host not in self.scheduled_hosts:
+                self._schedule(host)
+
+    def _complete(self, url):
+        urlhash = url_fingerprint(url).hex()
+        cursor = self.save.execute(
+            "UPDATE urls SET state = ? WHERE urlhash = ?", (COMPLETE, urlhash))
+        if not cursor.rowcount:
+            # This should not happen.
+            self.logger.error(
+                f"Completed url {url}, but have not seen it before.")
+        self.uncommitted += 1
+
+    def pending_count(self):
+        with self.lock:
+            count, = self.save.execute(
+                "SELECT COUNT(*) FROM urls WHERE state = ?", (PENDING,)).fetchone()
+            return count
+
+    def close(self):
+        with self.lock:
+            self.save.execute("COMMIT")
+            self.save.close()
@@ -1,13 +1,14 @@
 from threading import Thread
-import hashlib
-from urllib.parse import urlparse, urlunparse
+from urllib.parse import urlsplit
 from inspect import getsource
 from utils.download import download
 from utils.url_pattern_detection import get_url_pattern_hash
+from utils.canonical_url import url_fingerprint
 from utils import get_logger
+from utils.config import node_file
 import scraper
-import time
-from collections import defaultdict
+from utils.crawl_stats import write_atomic
+from utils.metrics import metrics, profiler
 import tldextract
 import json
 
@@ -16,68 +17,149 @@ class Worker(Thread):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
-        self.seen_urls = set()
-        self.seen_url_patterns = defaultdict(int)
-        self.subdomains_count = defaultdict(int)
-        self.counts_stats_file = "count_stats.txt"
-        self.MAX_URL_PATTERN_HITS = 500
-        self.MAX_SUBDOMAIN_HITS = 10000
+        # seen urls, url pattern and subdomain limits are shared by all workers
+        self.stats = scraper.crawl_stats
+        self.traps = scraper.trap_detector
+        self.counts_stats_file = node_file("count_stats.txt", config.node_id)
         # basic check for requests in scraper
         assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
         assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
         super().__init__(daemon=True)
     def write_stats(self):
-        data = {
-            "num_urls": len(self.seen_urls),
-            "subdomain_count": dict(self.subdomains_count)
-        }
-        with open(self.counts_stats_file, "w") as f:
-            json.dump(data, f, indent=4) 
+        write_count_stats(self.counts_stats_file, self.stats)
+    def next_url(self):
+        # the next url to download, None once the frontier is done. The frontier
+        # checks urls against cached robots.txt rules only (it holds its lock),
+        # so a url is checked again here, where a robots.txt may be downloaded
+        while True:
+            with metrics.timer("frontier_get"):
+                tbd_url = self.frontier.get_tbd_url()
+            if not tbd_url or scraper.is_valid(tbd_url):
+                return tbd_url
+            self.logger.info(f"Skipping {tbd_url}, it is no longer a valid url.")
+            self.frontier.mark_url_complete(tbd_url)
+    def skip_quarantined(self, tbd_url):
+        if not self.traps.is_quarantined(get_url_pattern_hash(tbd_url)):
+            return False
+        # queued before its pattern was found to be a trap
+        self.logger.info(f"Skipping {tbd_url}, its url pattern is quarantined.")
+        self.frontier.mark_url_complete(tbd_url)
+        return True
+    def log_download(self, tbd_url, resp):
+        self.logger.info(
+            f"Downloaded {tbd_url}, status <{resp.status}>, "
+            f"using cache {self.config.cache_server}.")
+    def process(self, tbd_url, resp):
+        # scrapes a downloaded page, queues its new links and completes tbd_url
+        self.log_download(tbd_url, resp)
+        metrics.count("responses", str(resp.status))
+        scraper.archive_response(tbd_url, resp)
+        with metrics.timer("scrape"):
+            # scraper.scraper in its two halves, the page's result is kept
+            # so the frontier can score the links by it
+            # an unchanged page of a re-crawl is not parsed again
+            result = scraper.cached_result(tbd_url, resp)
+            if result is None:
+                if scraper.parse_pool is None:
+                    result = scraper.analyze_response(tbd_url, resp, scraper.parser_engine, check_duplicate=True)
+                else:
+                    # parsed in a parser process, recorded here
+                    with metrics.timer("parse_pool"):
+                        result = scraper.parse_pool.analyze(tbd_url, resp)
+                scraper.cache_result(tbd_url, resp, result)
+            scraped_urls = scraper.record_result(tbd_url, result)
+        self.add_links(tbd_url, scraped_urls, result)
+    def add_links(self, tbd_url, scraped_urls, result=None):
+        with metrics.timer("queue_links"):
+            if self.config.nodes:
+                # links to hosts another node owns are filtered and queued there
+                scraped_urls = self.frontier.forward_remote(scraped_urls, result)
+            urls, fingerprints = self._new_links(scraped_urls)
+        # the page is completed and its links added in one frontier write,
+        # politeness is enforced per host by the frontier
+        with metrics.timer("frontier_complete"):
+            self.frontier.mark_complete_and_add(tbd_url, urls, fingerprints, result)
+        metrics.count("links_queued", amount=len(urls))
+    def _new_links(self, scraped_urls):
+        return filter_links(scraped_urls, self.stats, self.traps, self.write_stats)
+    def failed(self, tbd_url, error):
+        # counted by exception type and logged instead of silently dropped
+        metrics.count("errors", type(error).__name__)
+        self.logger.error(f"Failed to crawl {tbd_url}: {type(error).__name__}: {error}")
+        self.frontier.mark_url_failed(tbd_url)
     def run(self):
         while True:
-            tbd_url = self.frontier.get_tbd_url()
+            # includes waiting for a host to become ready
+            tbd_url = self.next_url()
             try:
                 if not tbd_url:
                     self.logger.info("Frontier is empty. Stopping Crawler.")
                     break
-                resp = download(tbd_url, self.config, self.logger)
-                self.logger.info(
-                    f"Downloaded {tbd_url}, status <{resp.status}>, "
-                    f"using cache {self.config.cache_server}.")
-                scraped_urls = scraper.scraper(tbd_url, resp)
-                for scraped_url in scraped_urls:
-                    parsed_url = urlparse(scraped_url)._replace(scheme='',fragment="")
-                    url_str =  urlunparse(parsed_url)
-                    hashed_url = hashlib.sha256(url_str.encode('utf-8')).hexdigest()
-                    hashed_url_pattern = get_url_pattern_hash(scraped_url)
-                    
+                if self.skip_quarantined(tbd_url):
+                    continue
+                with profiler.maybe_profile():
+                    with metrics.timer("download"):
+                        resp = download(tbd_url, self.config, self.logger)
+                    self.process(tbd_url, resp)
+            except Exception as e:
+                self.failed(tbd_url, e)
+                continue
 
-                    if hashed_url in self.seen_urls:
-                        print(f"Hashed url already seen...skipping")
-                        continue
+def write_count_stats(path, stats):
+    data = {
+        "num_urls": len(stats.seen_urls),
+        "subdomain_count": dict(stats.subdomain_hits.items())
+    }
+    write_atomic(path, json.dumps(data, indent=4))
 
-                    if self.seen_url_patterns[hashed_url_pattern] >= self.MAX_URL_PATTERN_HITS:
-                        print(f"Hashed url pattern reaached its limit:", hashed_url_pattern)
-                        continue
-                    
-                    curr_subdomain = tldextract.extract(parsed_url.hostname).subdomain
-                    if self.subdomains_count[curr_subdomain] >= self.MAX_SUBDOMAIN_HITS:
-                        print(f"Subdomain has reaached its limit:", subdomain)
-                        continue
-                    
-                    self.subdomains_count[curr_subdomain] += 1
-                
-                    depth = len([segment for segment in parsed_url.path.split('/') if segment])
-                    if depth >= 6:
-                        print(f"URL depth is 6 or more...skipping")
-                        continue
-                    self.seen_url_patterns[hashed_url_pattern] += 1
+def filter_links(scraped_urls, stats, traps, write_stats):
+    # returns the links to queue and their fingerprints. Scraped urls are
+    # canonical already (utils/canonical_url.py), the fingerprint is the
+    # one the frontier saves them under. write_stats() is called every
+    # 10 seen urls
+    urls = []
+    fingerprints = []
+    for scraped_url in scraped_urls:
+        parsed_url = urlsplit(scraped_url)
+        hashed_url = url_fingerprint(scraped_url)
+        hashed_url_pattern = get_url_pattern_hash(scraped_url)
 
-                    self.seen_urls.add(hashed_url)
-                    if len(self.seen_urls) % 10 == 0:
-                        self.write_stats()
-                    self.frontier.add_url(scraped_url)
-                self.frontier.mark_url_complete(tbd_url)
-                time.sleep(self.config.time_delay)
-            except Exception:
-                continue
+        if traps.is_quarantined(hashed_url_pattern):
+            metrics.count("links_skipped", "quarantined")
+            continue
+
+        if hashed_url in stats.seen_urls:
+            print(f"Hashed url already seen...skipping")
+            metrics.count("links_skipped", "seen")
+            continue
+
+        if stats.url_pattern_hits[hashed_url_pattern] >= stats.max_url_pattern_hits:
+            print(f"Hashed url pattern reaached its limit:", hashed_url_pattern)
+            metrics.count("links_skipped", "pattern_limit")
+            continue
+        
+        curr_subdomain = tldextract.extract(parsed_url.hostname).subdomain
+        if not stats.subdomain_hits.increment_below(curr_subdomain, stats.max_subdomain_hits):
+            print(f"Subdomain has reaached its limit:", curr_subdomain)
+            metrics.count("links_skipped", "subdomain_limit")
+            continue
+    
+        depth = len([segment for segment in parsed_url.path.split('/') if segment])
+        if depth >= 6:
+            print(f"URL depth is 6 or more...skipping")
+            metrics.count("links_skipped", "depth")
+            continue
+
+        # re-checked atomically, another worker may have taken the last slot
+        if not stats.url_pattern_hits.increment_below(hashed_url_pattern, stats.max_url_pattern_hits):
+            metrics.count("links_skipped", "pattern_limit")
+            continue
+
+        if not stats.seen_urls.add(hashed_url):
+            metrics.count("links_skipped", "seen")
+            continue
+        if len(stats.seen_urls) % 10 == 0:
+            write_stats()
+        urls.append(scraped_url)
+        fingerprints.append(hashed_url)
+    return urls, fingerprints
@@ -3,21 +3,32 @@ from argparse import ArgumentParser
 
 from utils.server_registration import get_cache_server
 from utils.config import Config
-from crawler import Crawler
+from crawler import Crawler, get_frontier_factory, get_worker_factory
+from crawler.distributed import node_config
 
 
-def main(config_file, restart):
+def main(config_file, restart, recrawl=False, node=0):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
+    config.recrawl = recrawl
+    # a re-crawl starts over from the seeds like a restart
+    restart = restart or recrawl
+    if config.nodes:
+        # one of several crawler processes, each crawls its share of the hosts
+        node_config(config, node)
     config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    crawler = Crawler(
+        config, restart, frontier_factory=get_frontier_factory(config),
+        worker_factory=get_worker_factory(config))
     crawler.start()
 
 
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
+    parser.add_argument("--recrawl", action="store_true", default=False)
+    parser.add_argument("--node", type=int, default=0)
     parser.add_argument("--config_file", type=str, default="config.ini")
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.recrawl, args.node)
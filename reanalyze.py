@@ -0,0 +1,46 @@
+import os
+import tempfile
+from configparser import ConfigParser
+from argparse import ArgumentParser
+
+import scraper
+from utils.config import Config
+from utils.archive import ArchiveReader
+
+
+def main(config_file, archive, stats_file, processes):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    archive = archive or config.archive
+    assert archive, "pass --archive or set ARCHIVE in the config file"
+    # offline: nothing is downloaded (robots.txt included) and the crawl's
+    # save files, page cache and archive are left alone
+    config.robots = "archived"
+    config.page_cache = ""
+    config.archive = ""
+    config.stats_file = stats_file
+    config.parse_processes = processes
+    with tempfile.TemporaryDirectory() as tmp:
+        config.save_file = os.path.join(tmp, "reanalyze")
+        scraper.configure(config, restart=True)
+        pages = ((resp.url, resp) for resp in ArchiveReader(archive).pages())
+        if scraper.parse_pool is None:
+            for url, resp in pages:
+                scraper.extract_next_links(url, resp)
+        else:
+            for url, resp, result in scraper.parse_pool.analyze_many(pages):
+                scraper.record_result(url, result)
+        scraper.write_to_file()
+        scraper.close()
+    print(f"{scraper.crawl_stats.pages} pages recorded, statistics written to {stats_file}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--archive", type=str, default="", help="archive directory, ARCHIVE of the config file by default")
+    parser.add_argument("--stats_file", type=str, default="reanalyzed_statistics.txt")
+    parser.add_argument("--processes", type=int, default=0, help="parser processes, 0 parses in this process")
+    args = parser.parse_args()
+    main(args.config_file, args.archive, args.stats_file, args.processes)
@@ -1,16 +1,137 @@
-import re
-from urllib.parse import urlparse, urljoin, urldefrag
-from bs4 import BeautifulSoup
-from utils.tokenizer import tokenize, compute_word_frequencies
-from itertools import islice
-
-longest_page_url = None
-longest_page_word_count = 0
-most_common_words = {}
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlparse
+from utils.tokenizer import compute_word_frequencies
+from utils.page_analysis import analyze_page
+from utils.crawl_stats import CrawlStats, StatsWriter
+from utils.seen_set import make_seen_set
+from utils.trap_detector import TrapDetector
+from utils.fingerprint import DuplicateDetector, content_checksum, simhash
+from utils.parse_pool import ParsePool
+from utils.robots import RobotsCache, make_robots_fetch
+from utils.metrics import metrics
+from utils.url_pattern_detection import get_url_pattern_hash
+from utils.canonical_url import canonicalize
+from utils.response import content_size, content_type
+from utils.page_cache import PageCache
+from utils.archive import ArchiveWriter
+
+# shared by every worker thread, see utils/crawl_stats.py
+crawl_stats = CrawlStats()
+# url patterns that turned out to be traps, see utils/trap_detector.py
+trap_detector = TrapDetector()
+# fingerprints of crawled pages, see utils/fingerprint.py
+duplicate_detector = DuplicateDetector()
+parser_engine = "stream"
+# parser processes, None parses in the worker threads, see utils/parse_pool.py
+parse_pool = None
+# robots.txt of every crawled host, None uses only the builtin rules, see utils/robots.py
+robots = None
+# pages larger than this are not parsed, 0 for no limit (MAX_RESPONSE_BYTES)
+max_response_bytes = 0
+# Content-Types of the pages that are parsed, empty parses every page (CONTENT_TYPES)
+content_types = frozenset()
+# results of the pages crawled, reused for unchanged pages on a re-crawl, see utils/page_cache.py
+page_cache = None
+# True on a re-crawl (launch.py --recrawl), when page_cache is read as well as written
+reuse_page_cache = False
+# writes every downloaded page to disk for reanalyze.py, None keeps no pages, see utils/archive.py
+archive = None
+
+# the crawled domains, with or without a leading "www."
+ALLOWED_DOMAINS = frozenset(['ics.uci.edu', 'cs.uci.edu', 'informatics.uci.edu', 'stat.uci.edu'])
+# links to files with these extensions are not crawled
+EXCLUDED_EXTENSIONS = frozenset([
+    "css", "js", "bmp", "gif", "jpg", "jpeg", "ico",
+    "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+    "wav", "avi", "mov", "mpeg", "mpg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+    "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+    "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso", "bib", "pov", "ff", "lif",
+    "epub", "dll", "cnf", "tgz", "sha1",
+    "thmx", "mso", "arff", "rtf", "jar", "csv",
+    "c", "cpp", "cp", "h", "xml", "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz"])
+TRAP_PATTERNS = ("https://isg.ics.uci.edu/events/*", "gitlab.ics.uci.edu",
+                 "http://fano.ics.uci.edu/ca/rules/", "/calendar", "/events")
+
+# what analyze_response() found on a page, small enough to send between processes
+PageResult = namedtuple("PageResult", [
+    "fetched",      # False if the download failed or went outside the crawl
+    "word_count",   # number of tokens on the page
+    "word_freqs",   # non stopword token frequencies
+    "checksum",     # exact content fingerprint
+    "fingerprint",  # SimHash of the tokens
+    "links",        # valid links worth following, empty for low-information pages
+    "crawl_delay",  # Crawl-delay of the page's host's robots.txt, None if it has none
+    "duplicate",    # whether analyze_response found a (near-)duplicate, None if left to record_result
+], defaults=(None, None))
+FAILED_FETCH = PageResult(False, 0, {}, None, 0, ())
+
+def render_stats():
+    longest_page_url, longest_page_word_count, most_common_words = crawl_stats.snapshot()
+    lines = ["Longest page URL: ", f"{longest_page_url} ({longest_page_word_count})\n\n",
+             "50 most common words:\n"]
+    for word, freq in most_common_words:
+        lines.append(f"{word}: {freq}\n")
+    return "".join(lines)
+
+stats_writer = StatsWriter(render_stats)
+
+def configure(config, restart=False):
+    # applies config.ini options to the scraper before any worker starts
+    global parser_engine, stats_writer, trap_detector, duplicate_detector, parse_pool, page_cache, reuse_page_cache, archive, _cached_verdict
+    parser_engine = config.parser
+    _cached_verdict = lru_cache(maxsize=config.valid_url_cache)(_verdict)
+    configure_analysis(config)
+    if config.parse_processes:
+        parse_pool = ParsePool(config.parse_processes, config.parser, config)
+    crawl_stats.seen_urls = make_seen_set(config.seen_set, config.seen_set_error_rate)
+    stats_writer = StatsWriter(
+        render_stats, config.stats_file, config.stats_flush_pages, config.stats_flush_seconds)
+    # quarantined patterns are kept next to the frontier's save file
+    trap_detector = TrapDetector(
+        f"{config.save_file}.traps", config.trap_min_fetches,
+        config.trap_min_distinct_ratio, config.trap_min_avg_words)
+    duplicate_detector = DuplicateDetector(
+        f"{config.save_file}.fingerprints", config.near_duplicate_distance)
+    if restart:
+        # overwrite what the previous crawl learned
+        trap_detector.save()
+    else:
+        trap_detector.load()
+        duplicate_detector.load()
+    duplicate_detector.open(restart)
+    reuse_page_cache = config.recrawl
+    if config.page_cache:
+        # a re-crawl starts over from the seeds but keeps what the last crawl saw
+        page_cache = PageCache(config.page_cache, restart and not config.recrawl)
+    if config.archive:
+        archive = ArchiveWriter(config.archive, restart, config.archive_compression, config.archive_file_bytes)
+
+def configure_analysis(config):
+    # the options analyze_response reads; parser processes call this too,
+    # each keeps its own robots.txt cache
+    global robots, max_response_bytes, content_types
+    max_response_bytes = config.max_response_bytes
+    content_types = config.content_types
+    robots = None
+    if config.robots == "fetch":
+        robots = RobotsCache(make_robots_fetch(config), config.user_agent, config.robots_ttl)
+    elif config.robots == "archived":
+        # set by reanalyze.py: the crawl's robots.txt rules admitted every archived page already
+        robots = RobotsCache(_no_robots_txt, config.user_agent)
+
+def _no_robots_txt(robots_url):
+    return 404, None
+
+def robots_crawl_delay(host):
+    # Crawl-delay of host's robots.txt if it was already fetched, never downloads
+    if robots is None:
+        return None
+    return robots.crawl_delay(host)
 
 def scraper(url, resp):
-    links = extract_next_links(url, resp)
-    return [link for link in links if is_valid(link)]
+    # extract_next_links only returns links that passed is_valid
+    return extract_next_links(url, resp)
 
 def extract_next_links(url, resp):
     # Implementation required.
@@ -24,183 +145,250 @@ def extract_next_links(url, resp):
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
     # if we can't scrape, return empty list
 
-    if resp.status != 200 or is_valid(resp.url) == False:
-        return []
-    
-    soup = BeautifulSoup(resp.raw_response.content, 'lxml')
+    return record_result(url, analyze_response(url, resp, parser_engine, check_duplicate=True))
 
-    # extracting tokens
-    readable_text = soup.get_text(separator=' ')
-    tokens = tokenize(readable_text)
+def analyze_response(url, resp, engine="stream", check_duplicate=False):
+    # the pure half of extract_next_links: reads only resp and touches no
+    # shared state, so it can run in a parser process. In the crawler process,
+    # check_duplicate runs the duplicate check before the links are filtered
+    if resp.status != 200 or is_valid(resp.url) == False:
+        return FAILED_FETCH
+    if not accept_response(resp):
+        return FAILED_FETCH
+
+    # parse the page once; stats, content checks and links all read from it
+    with metrics.timer("parse"):
+        page = analyze_page(resp, engine)
+    word_freqs = compute_word_frequencies(page.tokens)
+    checksum = content_checksum(page.tokens)
+    fingerprint = simhash(page.tokens)
+
+    duplicate = None
+    if check_duplicate:
+        # the links of a duplicate are never followed, so they are not filtered either
+        with metrics.timer("dedup"):
+            duplicate = duplicate_detector.check_and_add_fingerprint(checksum, fingerprint)
 
-    # updating statistics
-    update_stats(url, tokens)
-    write_to_file()
-    
     next_links = []
+    # low-information pages are not followed
+    if not duplicate and has_sufficient_content(page):
+        with metrics.timer("link_filter"):
+            # one spelling per url, so copies of a link are checked and queued once
+            for absolute_url in dict.fromkeys(map(canonicalize, page.links)):
+                # if new url is valid, add to list
+                if is_valid(absolute_url):
+                    next_links.append(absolute_url)
+                else:
+                    # prints when url isn't considered valid
+                    print("invalid url, outside of expected domain")
+        # debug that prints next links
+        print(next_links)
+
+    # sent along for record_result: with parser processes, only they fetch robots.txt
+    crawl_delay = robots_crawl_delay(urlparse(url).netloc.lower())
+    return PageResult(True, len(page.tokens), word_freqs, checksum,
+                      fingerprint, tuple(next_links), crawl_delay, duplicate)
+
+def _rejection(resp):
+    # why a page is not parsed, None if it is
+    if getattr(resp, "rejected", None) is not None:
+        # an archived page the crawl turned down, its content was not kept
+        return resp.rejected
+    too_large = hasattr(resp, 'error') and resp.error and "607" in str(resp.error)
+    if too_large or (max_response_bytes and content_size(resp) > max_response_bytes):
+        return "too_large"
+    page_type = content_type(resp) if content_types else None
+    if page_type is not None and page_type not in content_types:
+        return "content_type"
+    return None
+
+def accept_response(resp):
+    # decides before any parsing whether a page is parsed at all: pages marked
+    # too large by the server, larger than max_response_bytes (checked before
+    # the page is unpickled) or of a Content-Type not in content_types are not
+    rejection = _rejection(resp)
+    if rejection is not None:
+        metrics.count("responses_rejected", rejection)
+        return False
+    return True
 
-    # if page is low-information, return empty list
-    if not has_sufficient_content(resp):
+def archive_response(url, resp):
+    # queues a downloaded response for the archive; pages that are never
+    # parsed are archived without their content
+    if archive is not None:
+        rejection = _rejection(resp) if resp.status == 200 else None
+        archive.add(url, resp, with_content=resp.status == 200 and rejection is None, rejected=rejection)
+
+def cached_result(url, resp):
+    # on a re-crawl, what the last crawl found on url if the page did not
+    # change since, so it is not parsed again; None otherwise
+    if page_cache is None or not reuse_page_cache:
+        return None
+    # a page accept_response turns down is neither unpickled nor reused,
+    # it is left to analyze_response to reject and count
+    if _rejection(resp) is not None:
+        return None
+    saved = page_cache.lookup(url, resp)
+    if saved is None:
+        return None
+    metrics.count("page_cache", "hit")
+    result = PageResult(*saved)
+    # the rules may have changed since the links were saved, and the
+    # duplicate check is this crawl's
+    return result._replace(links=tuple(link for link in result.links if is_valid(link)), duplicate=None)
+
+def cache_result(url, resp, result):
+    # keeps the result of a page parsed in this crawl for the next re-crawl;
+    # a duplicate's links were not filtered, it is parsed again next time
+    if page_cache is not None and result.fetched and not result.duplicate:
+        page_cache.store(url, resp, result)
+
+def record_result(url, result):
+    # the stateful half of extract_next_links, runs in the crawler process:
+    # dedup, statistics and trap detection. Returns the links to follow.
+    if not result.fetched:
+        # a fetch that returned nothing counts against the url's pattern
+        trap_detector.record(get_url_pattern_hash(url), None, 0)
         return []
-    
-    # if page is marked too large by server, return empty list
-    if hasattr(resp, 'error') and resp.error and "607" in str(resp.error):
+
+    if result.crawl_delay is not None and robots is not None:
+        robots.note_crawl_delay(urlparse(url).netloc.lower(), result.crawl_delay)
+
+    # pages (nearly) identical to one already crawled add nothing new,
+    # they are left out of the statistics and their links are not followed
+    duplicate = result.duplicate
+    if duplicate is None:
+        with metrics.timer("dedup"):
+            duplicate = duplicate_detector.check_and_add_fingerprint(result.checksum, result.fingerprint)
+    if duplicate:
+        metrics.count("duplicate_pages")
+        if trap_detector.record(get_url_pattern_hash(url), None, 0):
+            print(f"Quarantined the url pattern of {url}")
         return []
 
-    next_links = []
-    soup = BeautifulSoup(resp.raw_response.content, 'lxml')
-    found_links = soup.find_all('a')
-    for link in found_links:
-        # print("debug link:", link)
-        # extract link
-        href = link.get('href')
-        
-        if not href:
-            continue
-        absolute_url = urljoin(resp.url, href)
-        # absolute_url = absolute_url.replace(fragment="")
-        absolute_url, fragment = urldefrag(absolute_url)
-        #  parsed = urlparse(url)
-
-        # if new url is valid, add to list
-        if is_valid(absolute_url):
-            next_links.append(absolute_url)
-        else:
-            # prints when url isn't considered valid
-            print("invalid url, outside of expected domain")
-    # debug that prints next links
-    print(next_links)
-    return next_links
-
-def is_valid(url):
+    # updating statistics
+    with metrics.timer("stats_update"):
+        crawl_stats.record_page(url, result.word_count, result.word_freqs)
+        stats_writer.page_done()
+
+    # let the trap detector learn from what this url pattern yields
+    if trap_detector.record(get_url_pattern_hash(url), result.checksum, sum(result.word_freqs.values())):
+        print(f"Quarantined the url pattern of {url}")
+
+    return list(result.links)
+
+class UrlParts(object):
+    # one urlparse of a url, shared by all the is_valid rules
+    __slots__ = ("scheme", "netloc", "path", "params", "query", "lower_path", "lower_query")
+
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.scheme = parsed.scheme
+        self.netloc = parsed.netloc
+        self.path = parsed.path
+        self.params = parsed.params
+        self.query = parsed.query
+        self.lower_path = parsed.path.lower()
+        self.lower_query = parsed.query.lower()
+
+def is_valid(url, fetch_robots=True):
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
+    # Verdicts are memoized, they only change when a robots.txt is (re)fetched.
+    # fetch_robots=False never downloads a robots.txt, a host whose rules are
+    # not cached gets the builtin rules (e.g. while the frontier is locked)
     try:
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        
-        # check if url is within the 4 specified domains
-        if not within_domains(url):
-            return False
-        
-        # check if url is allowed by robots.txt
-        if not obeys_robots_rules(url):
-            return False
-        
-        # check if known trap
-        if not is_not_known_trap(url):
-            return False
-        
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|mpg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso|bib|pov|ff|lif"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|c|cpp|cp|h|xml|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
-
+        return _cached_verdict(url, robots.generation if robots is not None else 0, fetch_robots)
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
 
+def _verdict(url, robots_generation, fetch_robots=True):
+    # the rules run cheapest first and stop at the first that fails,
+    # robots.txt last because it may have to be downloaded
+    parts = UrlParts(url)
+    if parts.scheme != "http" and parts.scheme != "https":
+        return False
 
-def within_domains(url):
-    allowed = ['ics.uci.edu', 'cs.uci.edu', 'informatics.uci.edu', 'stat.uci.edu']
-    hostname = urlparse(url).netloc
-    hostname = hostname.removeprefix('www.')
-    if hostname not in allowed:
+    # check if url is within the 4 specified domains
+    if parts.netloc.removeprefix('www.') not in ALLOWED_DOMAINS:
         return False
-    return True
 
-def update_stats(url, tokens):
-    global longest_page_url, longest_page_word_count, most_common_words
-    word_count = len(tokens)
+    # files that are not web pages, by the extension of the path
+    if parts.lower_path.rpartition(".")[2] in EXCLUDED_EXTENSIONS:
+        return False
 
-    # update longest page word count
-    if word_count > longest_page_word_count:
-        longest_page_word_count = word_count
-        longest_page_url = url
+    # check if known trap
+    if not _is_not_known_trap(parts):
+        return False
 
-    # update 50 most common words
-    word_freqs = compute_word_frequencies(tokens)
-    merge_frequencies(most_common_words, word_freqs)
+    # check if url is allowed by robots.txt
+    return _obeys_robots_rules(parts, fetch_robots)
 
-def merge_frequencies(global_word_freqs, word_freqs):
-    for token, count in word_freqs.items():
-        if token in global_word_freqs:
-            global_word_freqs[token] += count
-        else:
-            global_word_freqs[token] = count
+_cached_verdict = lru_cache(maxsize=1 << 17)(_verdict)
 
-def write_to_file(file="crawler_statistics.txt"):
-    with open(file, "w") as f:
-        f.write("Longest page URL: ")
-        f.write(f"{longest_page_url} ({longest_page_word_count})\n\n")
 
-        f.write("50 most common words:\n")
+def within_domains(url):
+    hostname = urlparse(url).netloc
+    return hostname.removeprefix('www.') in ALLOWED_DOMAINS
 
-        # sort global word frequencies descending
-        sorted_freqs = {token : freq for token, freq in sorted(most_common_words.items(), key=lambda item:item[1], reverse=True)}
+def write_to_file():
+    # writes the current statistics snapshot now, e.g. at shutdown
+    stats_writer.flush()
 
-        for word, freq in islice(sorted_freqs.items(), 50):
-            f.write(f"{word}: {freq}\n")
+def close():
+    # releases the fingerprint file, the caches and the parser processes at shutdown
+    duplicate_detector.close()
+    if page_cache is not None:
+        page_cache.close()
+    if archive is not None:
+        archive.close()
+    if parse_pool is not None:
+        parse_pool.close()
 
 
-def has_sufficient_content(resp, min_words=100, min_ratio=0.001):
+def has_sufficient_content(page, min_words=100, min_ratio=0.001):
     # returns True if the page has enough textual/informational content to be useful
-    if resp.raw_response is None or resp.raw_response.content is None:
-        return False
-    
-    content = resp.raw_response.content
+    # page: PageAnalysis from utils.page_analysis.analyze_page
 
     # pages with small byte-size are probably low-information
     # 404 error pages are typically 512 bytes
-    if len(content) <= 512:
+    if page.content_length <= 512:
         return False
-    
-    # checking visible word count of the page for info as well
-    soup = BeautifulSoup(content, 'lxml')
-
-    # remove non-visible / non-informational elements
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-
-    # tokenize visible text 
-    visible_text = soup.get_text(separator=' ')
-    words = tokenize(visible_text)
 
     # check if number of words and ratio of HTML to text is sufficient
-    word_count = len(words)
-    ratio = word_count / max(len(content), 1) # max used to prevent division by 0
-    return word_count >= min_words and ratio >= min_ratio
+    return page.word_count >= min_words and page.text_ratio >= min_ratio
 
 
 def is_not_known_trap(url):
-    trap_patterns = ["https://isg.ics.uci.edu/events/*", 
-                     "gitlab.ics.uci.edu",
-                     "http://fano.ics.uci.edu/ca/rules/",
-                     "/calendar", "/events"]
+    return _is_not_known_trap(UrlParts(url))
 
-    parsed = urlparse(url)
-    path = parsed.path.lower()
-    query = parsed.query.lower()
-
-    for pattern in trap_patterns:
-        if pattern in path or pattern in query:
+def _is_not_known_trap(parts):
+    for pattern in TRAP_PATTERNS:
+        if pattern in parts.lower_path or pattern in parts.lower_query:
             return False
-        
     return True
 
 
 def obeys_robots_rules(url):
+    return _obeys_robots_rules(UrlParts(url))
+
+def _obeys_robots_rules(parts, fetch=True):
+    # the host's own robots.txt decides when it could be fetched,
+    # the builtin rules when it could not or fetching is turned off
+    if robots is not None:
+        path = f"{parts.path};{parts.params}" if parts.params else parts.path
+        allowed, _ = robots.check(parts.scheme, parts.netloc, path, parts.query, fetch)
+        if allowed is not None:
+            return allowed
+    return _builtin_robots_rules(parts.netloc.removeprefix("www."), parts.path)
+
+def builtin_robots_rules(url):
+    # the robots.txt rules of the crawled domains as they were written down by hand
     parsed = urlparse(url)
-    host = parsed.netloc.removeprefix("www.")
-    path = parsed.path
+    return _builtin_robots_rules(parsed.netloc.removeprefix("www."), parsed.path)
 
+def _builtin_robots_rules(host, path):
     # informatics.uci.edu
     inf_allowed_paths = ["/wp-admin/admin-ajax.php", "/research/labs-centers/", "/research/areas-of-expertise/", 
                          "/research/example-research-projects/", "/research/phd-research/", "/research/past-dissertations/", 
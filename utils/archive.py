@@ -0,0 +1,258 @@
+import gzip
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import cbor
+
+from utils import get_logger
+from utils.canonical_url import canonicalize, url_fingerprint, FINGERPRINT_SIZE
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# first bytes of every record file, followed by one byte naming its codec
+MAGIC = b"CRAWLARC"
+CODECS = {"gzip": 0, "zstd": 1}
+CODEC_NAMES = {number: name for name, number in CODECS.items()}
+# every record is its compressed size followed by the compressed cbor record
+LENGTH = struct.Struct("<I")
+# every index entry: url fingerprint, offset of the record and its size
+INDEX_ENTRY = struct.Struct(f"<{FINGERPRINT_SIZE}sQI")
+FILE_NAME_RE = re.compile(r"^archive-(\d{5})\.rec$")
+
+# an archived page, read like a utils.response.Response by the scraper
+ArchivedPage = namedtuple("ArchivedPage", ["url", "status", "error", "content", "headers"])
+# rejected: why the crawl did not parse the page (scraper.accept_response), None if it did
+ArchivedResponse = namedtuple("ArchivedResponse", ["url", "status", "error", "raw_response", "fetched_at", "rejected"])
+
+# tells the writer thread to stop
+_STOP = object()
+
+
+def _record_path(directory, number):
+    return os.path.join(directory, f"archive-{number:05d}.rec")
+
+
+def _index_path(record_path):
+    return record_path[:-len(".rec")] + ".idx"
+
+
+def _record_files(directory):
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if FILE_NAME_RE.match(name))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _compressor(codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress
+    return lambda data: gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompressor(codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("the archive is zstd compressed, install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress
+    return gzip.decompress
+
+
+class ArchiveWriter(object):
+    """
+    Keeps the pages the crawler downloads in directory, so they can be
+    analyzed again without a re-crawl (see reanalyze.py).
+
+    Workers only queue a page (add); one background thread compresses the
+    queued pages and appends them in batches of up to batch_size to
+    archive-NNNNN.rec, each record its length followed by the zstd (or gzip,
+    when zstandard is not installed) compressed cbor record. Every file is
+    written up to file_bytes before the next one is started, and has an
+    archive-NNNNN.idx of (url fingerprint, offset, length) entries written
+    after the records they point at. A full queue makes workers wait.
+    """
+    def __init__(self, directory, restart=False, codec="zstd", file_bytes=256 << 20,
+                 batch_size=64, queue_size=1024):
+        if codec == "zstd" and zstandard is None:
+            codec = "gzip"
+        self.directory = directory
+        self.codec = codec
+        self.file_bytes = file_bytes
+        self.batch_size = batch_size
+        self.compress = _compressor(codec)
+        self.logger = get_logger("ARCHIVE")
+        os.makedirs(directory, exist_ok=True)
+        existing = _record_files(directory)
+        if restart:
+            for path in existing:
+                os.remove(path)
+                if os.path.exists(_index_path(path)):
+                    os.remove(_index_path(path))
+            existing = []
+        # a crawl that resumes starts a new file, the last one may end in a torn record
+        self.file_number = int(FILE_NAME_RE.match(os.path.basename(existing[-1])).group(1)) + 1 if existing else 0
+        self.file = None
+        self.index = None
+        self.queue = queue.Queue(queue_size)
+        self.thread = threading.Thread(target=self._run, name="ArchiveWriter", daemon=True)
+        self.thread.start()
+
+    def add(self, url, resp, with_content=True, rejected=None):
+        """
+        queues a cache server response, without its page when with_content is
+        False; rejected is why the crawl did not parse it, if it did not
+        """
+        raw = resp.raw_response if with_content else None
+        content = getattr(raw, "content", None) if raw is not None else None
+        headers = getattr(raw, "headers", None) if raw is not None else None
+        self.queue.put({
+            "url": url,
+            "status": resp.status,
+            "error": resp.error,
+            "time": time.time(),
+            "headers": dict(headers) if headers else {},
+            "content": content,
+            "rejected": rejected,
+        })
+
+    def _open_next(self):
+        self._close_files()
+        path = _record_path(self.directory, self.file_number)
+        self.file_number += 1
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + bytes([CODECS[self.codec]]))
+        self.index = open(_index_path(path), "wb")
+
+    def _close_files(self):
+        if self.file is not None:
+            self.file.close()
+            self.index.close()
+            self.file = self.index = None
+
+    def _write(self, batch):
+        if self.file is None or self.file.tell() >= self.file_bytes:
+            self._open_next()
+        records = []
+        entries = []
+        offset = self.file.tell()
+        for record in batch:
+            data = self.compress(cbor.dumps(record))
+            records.append(LENGTH.pack(len(data)))
+            records.append(data)
+            entries.append(INDEX_ENTRY.pack(url_fingerprint(record["url"]), offset, len(data)))
+            offset += LENGTH.size + len(data)
+        self.file.write(b"".join(records))
+        self.file.flush()
+        # the index never points past what is on disk
+        self.index.write(b"".join(entries))
+        self.index.flush()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            record = self.queue.get()
+            while record is not _STOP:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = record is _STOP
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    # e.g. a full disk; the crawl goes on without these pages
+                    self.logger.error(f"Could not archive {len(batch)} pages: {e}")
+        self._close_files()
+
+    def close(self):
+        """writes what is still queued and stops the writer thread"""
+        self.queue.put(_STOP)
+        self.thread.join()
+
+
+class ArchiveReader(object):
+    """
+    Reads the archive an ArchiveWriter left in directory through mmap: pages()
+    walks every record in the order it was written, get(url) finds the last
+    record of a url through the index files.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = _record_files(directory)
+        # url fingerprint -> (record file, offset, length), loaded on first get()
+        self.offsets = None
+
+    def _open(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= len(MAGIC):
+                return None, None
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if view[:len(MAGIC)] != MAGIC:
+            view.close()
+            raise ValueError(f"{path} is not a crawl archive")
+        return view, _decompressor(CODEC_NAMES[view[len(MAGIC)]])
+
+    @staticmethod
+    def _page(record):
+        page = ArchivedPage(record["url"], record["status"], record.get("error"),
+                            record.get("content"), record.get("headers") or {})
+        return ArchivedResponse(page.url, page.status, page.error, page, record.get("time"), record.get("rejected"))
+
+    def pages(self):
+        """every archived response in the order it was downloaded"""
+        for path in self.paths:
+            view, decompress = self._open(path)
+            if view is None:
+                continue
+            try:
+                offset = len(MAGIC) + 1
+                while offset + LENGTH.size <= len(view):
+                    length, = LENGTH.unpack_from(view, offset)
+                    start = offset + LENGTH.size
+                    if start + length > len(view):
+                        # a torn last record of a crawl that was killed
+                        break
+                    yield self._page(cbor.loads(decompress(view[start:start + length])))
+                    offset = start + length
+            finally:
+                view.close()
+
+    def _load_offsets(self):
+        self.offsets = dict()
+        for path in self.paths:
+            index_path = _index_path(path)
+            if not os.path.exists(index_path):
+                continue
+            with open(index_path, "rb") as f:
+                data = f.read()
+            for position in range(0, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size):
+                fingerprint, offset, length = INDEX_ENTRY.unpack_from(data, position)
+                self.offsets[fingerprint] = (path, offset, length)
+
+    def get(self, url):
+        """the last archived response of url, None if it was not archived"""
+        if self.offsets is None:
+            self._load_offsets()
+        location = self.offsets.get(url_fingerprint(canonicalize(url)))
+        if location is None:
+            return None
+        path, offset, length = location
+        view, decompress = self._open(path)
+        try:
+            start = offset + LENGTH.size
+            return self._page(cbor.loads(decompress(view[start:start + length])))
+        finally:
+            view.close()
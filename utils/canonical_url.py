@@ -0,0 +1,108 @@
+import re
+from functools import lru_cache
+from hashlib import blake2b
+from urllib.parse import quote, unquote_plus, urlsplit, urlunsplit
+
+from utils.url_pattern_detection import drop_control_query_params
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# characters that never need percent-encoding (RFC 3986 "unreserved")
+UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+# characters left as they are when a path or query is re-encoded
+PATH_SAFE = "/:@!$&'()*+,;=-._~%"
+QUERY_SAFE = PATH_SAFE + "?"
+ESCAPE_RE = re.compile(r"%([0-9A-Fa-f]{2})")
+STRAY_PERCENT_RE = re.compile(r"%(?![0-9A-Fa-f]{2})")
+# bytes of a url fingerprint, enough for a Bloom filter seen set
+FINGERPRINT_SIZE = 16
+
+
+def _escape(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else "%" + match.group(1).upper()
+
+
+def normalize_escapes(text, safe=PATH_SAFE):
+    """
+    One spelling for every percent-encoding: unreserved characters decoded,
+    other escapes upper case, spaces, non-ASCII and stray "%" encoded.
+    """
+    text = STRAY_PERCENT_RE.sub("%25", text)
+    text = quote(text, safe=safe)
+    return ESCAPE_RE.sub(_escape, text)
+
+
+def remove_dot_segments(path):
+    """resolves "." and ".." segments like RFC 3986 section 5.2.4"""
+    if "." not in path:
+        return path
+    output = []
+    segments = path.split("/")
+    for segment in segments[1:] if path.startswith("/") else segments:
+        if segment == "..":
+            if output:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        # "/a/b/.." is the directory "/a/"
+        output.append("")
+    return ("/" if path.startswith("/") else "") + "/".join(output)
+
+
+def _canonical_query(query):
+    pairs = [pair for pair in query.split("&") if pair]
+    if not pairs:
+        return ""
+    keys = [unquote_plus(pair.split("=", 1)[0]) for pair in pairs]
+    kept = drop_control_query_params(dict.fromkeys(keys))
+    # sorted by key only, repeated keys keep their order
+    pairs = sorted(((key, normalize_escapes(pair, QUERY_SAFE)) for key, pair in zip(keys, pairs) if key in kept),
+                   key=lambda item: item[0])
+    return "&".join(pair for _, pair in pairs)
+
+
+# pages link to the same navigation urls over and over
+@lru_cache(maxsize=1 << 16)
+def canonicalize(url):
+    """
+    The one spelling of url the crawler fetches, stores and compares:
+    lower case scheme and host, no default port, normalized
+    percent-encoding, dot-segments resolved, no trailing slash, query
+    parameters sorted with the tracking ones (utm_*, session ids...) dropped,
+    and no fragment. Urls that cannot be parsed are returned unchanged.
+    """
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").rstrip(".")
+        port = parts.port
+    except ValueError:
+        return url
+    if ":" in host:
+        # an IPv6 address loses its brackets in hostname
+        host = f"[{host}]"
+    netloc = host
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+    if "@" in parts.netloc:
+        netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+    path = remove_dot_segments(normalize_escapes(parts.path)).rstrip("/")
+    return urlunsplit((scheme, netloc, path, _canonical_query(parts.query), ""))
+
+
+def url_fingerprint(url):
+    """
+    FINGERPRINT_SIZE bytes identifying a canonical url, with the scheme and
+    a leading "www." left out, so http/https and www/no-www copies of a page
+    share one fingerprint.
+    """
+    _, _, rest = url.partition("://")
+    if rest.startswith("www."):
+        rest = rest[4:]
+    return blake2b(rest.encode("utf-8", errors="surrogatepass"), digest_size=FINGERPRINT_SIZE).digest()
+
+
+def url_key(url):
+    """hex fingerprint of any url, the key urls are saved under in the frontier"""
+    return url_fingerprint(canonicalize(url)).hex()
@@ -1,4 +1,6 @@
+import os
 import re
+from utils.page_analysis import PARSER_ENGINES
 
 
 class Config(object):
@@ -9,11 +11,68 @@ class Config(object):
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.stats_file = config["LOCAL PROPERTIES"].get("STATS_FILE", "crawler_statistics.txt").strip()
+        self.stats_flush_pages = int(config["LOCAL PROPERTIES"].get("STATS_FLUSH_PAGES", "100"))
+        self.stats_flush_seconds = float(config["LOCAL PROPERTIES"].get("STATS_FLUSH_SECONDS", "30"))
+        self.seen_set = config["LOCAL PROPERTIES"].get("SEEN_SET", "digest").strip()
+        assert self.seen_set in ("digest", "bloom"), "SEEN_SET should be digest or bloom"
+        self.seen_set_error_rate = float(config["LOCAL PROPERTIES"].get("SEEN_SET_ERROR_RATE", "0.0001"))
+        self.valid_url_cache = int(config["LOCAL PROPERTIES"].get("VALID_URL_CACHE", "131072"))
+        self.mode = config["LOCAL PROPERTIES"].get("MODE", "threads").strip()
+        assert self.mode in ("threads", "async"), "MODE should be threads or async"
+        self.async_concurrency = int(config["LOCAL PROPERTIES"].get("ASYNC_CONCURRENCY", "100"))
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSE_PROCESSES", "0"))
+        self.metrics_file = config["LOCAL PROPERTIES"].get("METRICS_FILE", "crawler_metrics.json").strip()
+        self.metrics_seconds = float(config["LOCAL PROPERTIES"].get("METRICS_SECONDS", "10"))
+        self.metrics_port = int(config["LOCAL PROPERTIES"].get("METRICS_PORT", "0"))
+        self.profile_sample_rate = float(config["LOCAL PROPERTIES"].get("PROFILE_SAMPLE_RATE", "0"))
+        self.profile_file = config["LOCAL PROPERTIES"].get("PROFILE_FILE", "crawler.pstats").strip()
+        self.page_cache = config["LOCAL PROPERTIES"].get("PAGE_CACHE", "page_cache.sqlite").strip()
+        self.archive = config["LOCAL PROPERTIES"].get("ARCHIVE", "").strip()
+        self.archive_compression = config["LOCAL PROPERTIES"].get("ARCHIVE_COMPRESSION", "zstd").strip()
+        assert self.archive_compression in ("zstd", "gzip"), "ARCHIVE_COMPRESSION should be zstd or gzip"
+        self.archive_file_bytes = int(config["LOCAL PROPERTIES"].get("ARCHIVE_FILE_BYTES", "268435456"))
+        self.nodes = [
+            (address.rsplit(":", 1)[0].strip(), int(address.rsplit(":", 1)[1]))
+            for address in config["LOCAL PROPERTIES"].get("NODES", "").split(",") if address.strip()]
+        self.forward_batch = int(config["LOCAL PROPERTIES"].get("FORWARD_BATCH", "256"))
+        self.forward_seconds = float(config["LOCAL PROPERTIES"].get("FORWARD_SECONDS", "0.5"))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.download_timeout = float(config["CONNECTION"].get("DOWNLOAD_TIMEOUT", "60"))
+        self.download_retries = int(config["CONNECTION"].get("DOWNLOAD_RETRIES", "3"))
+        self.download_backoff = float(config["CONNECTION"].get("DOWNLOAD_BACKOFF", "0.5"))
+        self.max_response_bytes = int(config["CONNECTION"].get("MAX_RESPONSE_BYTES", "5000000"))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.parser = config["CRAWLER"].get("PARSER", "stream").strip()
+        assert self.parser in PARSER_ENGINES, f"PARSER should be one of {PARSER_ENGINES}"
+        self.trap_min_fetches = int(config["CRAWLER"].get("TRAP_MIN_FETCHES", "20"))
+        self.trap_min_distinct_ratio = float(config["CRAWLER"].get("TRAP_MIN_DISTINCT_RATIO", "0.2"))
+        self.trap_min_avg_words = float(config["CRAWLER"].get("TRAP_MIN_AVG_WORDS", "30"))
+        self.near_duplicate_distance = int(config["CRAWLER"].get("NEAR_DUPLICATE_DISTANCE", "3"))
+        self.frontier_scorer = config["CRAWLER"].get("FRONTIER_SCORER", "lifo").strip()
+        assert self.frontier_scorer in ("lifo", "depth", "yield"), "FRONTIER_SCORER should be lifo, depth or yield"
+        self.robots = config["CRAWLER"].get("ROBOTS", "fetch").strip()
+        assert self.robots in ("fetch", "builtin"), "ROBOTS should be fetch or builtin"
+        self.robots_ttl = float(config["CRAWLER"].get("ROBOTS_TTL", "86400"))
+        self.content_types = frozenset(
+            content_type.strip().lower()
+            for content_type in config["CRAWLER"].get("CONTENT_TYPES", "text/html,application/xhtml+xml,text/plain").split(",")
+            if content_type.strip())
 
-        self.cache_server = None
\ No newline at end of file
+        self.cache_server = None
+        # set by launch.py --recrawl
+        self.recrawl = False
+        # set by launch.py --node when NODES is set
+        self.node_id = None
+
+
+def node_file(path, node_id):
+    """path with the node id before its extension, "frontier.shelve" -> "frontier.node1.shelve" """
+    if node_id is None or not path:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.node{node_id}{extension}"
@@ -0,0 +1,233 @@
+import os
+import time
+import tempfile
+from threading import Lock, local
+from heapq import heappush, heappop, heapify
+from utils.seen_set import DigestSet
+
+
+class TopKCounter(object):
+    """
+    Word counter that keeps its k most common words up to date as counts are
+    merged in, so reading the top words never sorts the whole vocabulary.
+
+    Counts only ever grow, so every word outside the top set has a count no
+    larger than the smallest count inside it. A word that passes that minimum
+    swaps places with it, which keeps the top set exact.
+    """
+    def __init__(self, k=50):
+        self.k = k
+        self.counts = {}
+        self.top = set()
+        # min-heap of (count, word) for words in self.top; entries go stale
+        # when a word's count grows or it leaves the top set
+        self.heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, word):
+        return self.counts[word]
+
+    def update(self, word_freqs):
+        """
+        :param word_freqs: dict of word -> count for one page
+        Time Complexity: O(m log k) - m = words on the page
+        """
+        for word, count in word_freqs.items():
+            total = self.counts.get(word, 0) + count
+            self.counts[word] = total
+            if word in self.top:
+                heappush(self.heap, (total, word))
+            elif len(self.top) < self.k:
+                self.top.add(word)
+                heappush(self.heap, (total, word))
+            elif total > self._min_entry()[0]:
+                _, evicted = heappop(self.heap)
+                self.top.discard(evicted)
+                self.top.add(word)
+                heappush(self.heap, (total, word))
+
+        # drop stale entries once they outnumber the live ones
+        if len(self.heap) > 4 * self.k + 64:
+            self.heap = [(self.counts[word], word) for word in self.top]
+            heapify(self.heap)
+
+    def _min_entry(self):
+        while True:
+            count, word = self.heap[0]
+            if word in self.top and self.counts[word] == count:
+                return count, word
+            heappop(self.heap)
+
+    def most_common(self):
+        """returns the top k (word, count) pairs, most common first. Time Complexity: O(k log k)"""
+        return sorted(((word, self.counts[word]) for word in self.top),
+                      key=lambda item: item[1], reverse=True)
+
+
+def write_atomic(path, text):
+    """writes text to a temp file next to path and renames it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class StatsWriter(object):
+    """
+    Debounces writes of the statistics snapshot: render() is only called every
+    flush_pages pages or flush_seconds seconds, and once more by flush() at
+    shutdown.
+    """
+    def __init__(self, render, path="crawler_statistics.txt", flush_pages=100, flush_seconds=30.0):
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.render = render
+        self.path = path
+        self.flush_pages = flush_pages
+        self.flush_seconds = flush_seconds
+        self.pending_pages = 0
+        self.last_flush = time.monotonic()
+
+    def page_done(self):
+        with self.lock:
+            self.pending_pages += 1
+            if (self.pending_pages < self.flush_pages
+                    and time.monotonic() - self.last_flush < self.flush_seconds):
+                return
+            self.pending_pages = 0
+            self.last_flush = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        # workers only share self.lock for the page counter, a slow write
+        # holds up nobody but the thread doing it (and any concurrent flush)
+        with self.flush_lock:
+            write_atomic(self.path, self.render())
+
+
+class StripedCounter(object):
+    """
+    Counters keyed by string, split over stripes that each have their own
+    lock, so threads touching different keys rarely wait on each other.
+    """
+    def __init__(self, stripes=16):
+        self.stripes = [({}, Lock()) for _ in range(stripes)]
+
+    def _stripe(self, key):
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    def __getitem__(self, key):
+        counts, _ = self._stripe(key)
+        return counts.get(key, 0)
+
+    def increment_below(self, key, limit):
+        """adds one to key unless it already reached limit, returns True if it was added"""
+        counts, lock = self._stripe(key)
+        with lock:
+            count = counts.get(key, 0)
+            if count >= limit:
+                return False
+            counts[key] = count + 1
+            return True
+
+    def items(self):
+        items = []
+        for counts, lock in self.stripes:
+            with lock:
+                items.extend(counts.items())
+        return items
+
+
+class _PageBuffer(object):
+    """per-thread page stats waiting to be merged into CrawlStats"""
+    def __init__(self):
+        self.lock = Lock()
+        self.word_freqs = {}
+        self.pages = 0
+        self.longest_page_word_count = 0
+        self.longest_page_url = None
+
+
+class CrawlStats(object):
+    """
+    Crawl statistics shared by every worker thread.
+
+    Page word counts go into a buffer owned by the calling thread and are
+    merged into the global TopKCounter every merge_pages pages, so workers only
+    meet on the global lock once per batch. URL, url-pattern and subdomain
+    limits are striped so they hold across all workers without one big lock.
+    """
+    def __init__(self, k=50, merge_pages=20, max_url_pattern_hits=500, max_subdomain_hits=10000):
+        self.merge_pages = merge_pages
+        self.max_url_pattern_hits = max_url_pattern_hits
+        self.max_subdomain_hits = max_subdomain_hits
+
+        self.seen_urls = DigestSet()
+        self.url_pattern_hits = StripedCounter()
+        self.subdomain_hits = StripedCounter()
+
+        self.lock = Lock()
+        self.most_common_words = TopKCounter(k)
+        self.pages = 0
+        self.longest_page_word_count = 0
+        self.longest_page_url = None
+
+        self.local = local()
+        self.buffers = []
+        self.buffers_lock = Lock()
+
+    def _buffer(self):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            buffer = self.local.buffer = _PageBuffer()
+            with self.buffers_lock:
+                self.buffers.append(buffer)
+        return buffer
+
+    def record_page(self, url, word_count, word_freqs):
+        buffer = self._buffer()
+        with buffer.lock:
+            buffer.pages += 1
+            if word_count > buffer.longest_page_word_count:
+                buffer.longest_page_word_count = word_count
+                buffer.longest_page_url = url
+            for word, count in word_freqs.items():
+                buffer.word_freqs[word] = buffer.word_freqs.get(word, 0) + count
+            if buffer.pages >= self.merge_pages:
+                self._merge(buffer)
+
+    def _merge(self, buffer):
+        # caller holds buffer.lock; lock order is always buffer, then self.lock
+        with self.lock:
+            self.pages += buffer.pages
+            if buffer.longest_page_word_count > self.longest_page_word_count:
+                self.longest_page_word_count = buffer.longest_page_word_count
+                self.longest_page_url = buffer.longest_page_url
+            self.most_common_words.update(buffer.word_freqs)
+        buffer.word_freqs = {}
+        buffer.pages = 0
+        buffer.longest_page_word_count = 0
+        buffer.longest_page_url = None
+
+    def merge_all(self):
+        """merges every thread's pending buffer, used before taking a snapshot"""
+        with self.buffers_lock:
+            buffers = list(self.buffers)
+        for buffer in buffers:
+            with buffer.lock:
+                self._merge(buffer)
+
+    def snapshot(self):
+        """returns (longest_page_url, longest_page_word_count, most common (word, count) pairs)"""
+        self.merge_all()
+        with self.lock:
+            return (self.longest_page_url, self.longest_page_word_count,
+                    self.most_common_words.most_common())
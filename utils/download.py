@@ -1,21 +1,179 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import cbor
-import time
+from requests.adapters import HTTPAdapter
 
 from utils.response import Response
 
-def download(url, config, logger=None):
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# cache server replies worth retrying, it answers these while overloaded
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# status the cache server gives pages too large to download
+TOO_LARGE_STATUS = 607
+# bytes read from a reply at a time
+CHUNK_SIZE = 1 << 16
+
+# one keep-alive session per worker thread, requests.Session is not thread safe
+_local = threading.local()
+
+
+def _session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        # a thread has one request open at a time, one kept-alive connection is enough
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _local.session = session
+    return session
+
+
+def _query(url, config):
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    return f"http://{host}:{port}/", [("q", f"{url}"), ("u", f"{config.user_agent}")]
+
+
+def _backoff(config, attempt):
+    return config.download_backoff * (2 ** attempt)
+
+
+def _to_response(url, status, content, logger):
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+        if content:
+            return Response(cbor.loads(content))
     except (EOFError, ValueError) as e:
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    if logger:
+        logger.error(f"Spacetime Response error <{status}> with url {url}.")
     return Response({
-        "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "error": f"Spacetime Response error <{status}> with url {url}.",
+        "status": status,
         "url": url})
+
+
+def _too_large(url, config, logger):
+    error = f"Response larger than {config.max_response_bytes} bytes with url {url}."
+    if logger:
+        logger.error(error)
+    return Response({"error": error, "status": TOO_LARGE_STATUS, "url": url})
+
+
+def _read_body(resp, limit):
+    # the reply's body, or None as soon as it is larger than limit bytes (0 is
+    # no limit); the connection is then dropped instead of read to the end
+    length = resp.headers.get("Content-Length", "")
+    if limit and length.isdigit() and int(length) > limit:
+        resp.close()
+        return None
+    body = bytearray()
+    for chunk in resp.iter_content(CHUNK_SIZE):
+        body += chunk
+        if limit and len(body) > limit:
+            resp.close()
+            return None
+    return bytes(body)
+
+
+def download(url, config, logger=None):
+    """
+    Fetches url through the cache server on this thread's pooled session.
+    Timeouts, connection errors and overload replies are retried up to
+    config.download_retries times with exponential backoff; the last
+    connection error is raised. A reply larger than
+    config.max_response_bytes is not read further and becomes a 607 response.
+    """
+    cache_url, params = _query(url, config)
+    session = _session()
+    for attempt in range(config.download_retries + 1):
+        last_try = attempt == config.download_retries
+        try:
+            resp = session.get(cache_url, params=params, timeout=config.download_timeout, stream=True)
+            if resp.status_code not in RETRY_STATUSES or last_try:
+                content = _read_body(resp, config.max_response_bytes)
+                if content is None:
+                    return _too_large(url, config, logger)
+                # like before, an error reply's body is not decoded
+                return _to_response(url, resp.status_code, content if resp.ok else None, logger)
+            resp.close()
+        except (requests.ConnectionError, requests.Timeout):
+            if last_try:
+                raise
+        time.sleep(_backoff(config, attempt))
+
+
+class AsyncDownloader(object):
+    """
+    Downloads from the cache server inside an asyncio loop with at most
+    config.async_concurrency requests in flight.
+
+    Uses one pooled aiohttp session when aiohttp is installed. Without it the
+    blocking download() runs on a thread pool of the same size, so the async
+    worker mode works either way. Use as "async with AsyncDownloader(...)".
+    """
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.logger = logger
+        self.limit = asyncio.Semaphore(config.async_concurrency)
+        self.session = None
+        self.executor = None
+
+    async def __aenter__(self):
+        if aiohttp is not None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.config.async_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.config.download_timeout))
+        else:
+            self.executor = ThreadPoolExecutor(self.config.async_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.session is not None:
+            await self.session.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    async def download(self, url):
+        async with self.limit:
+            if self.session is None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self.executor, download, url, self.config, self.logger)
+            return await self._fetch(url)
+
+    async def _fetch(self, url):
+        cache_url, params = _query(url, self.config)
+        retries = self.config.download_retries
+        for attempt in range(retries + 1):
+            try:
+                async with self.session.get(cache_url, params=params) as resp:
+                    if resp.status not in RETRY_STATUSES or attempt == retries:
+                        content = await self._read_body(resp)
+                        if content is None:
+                            return _too_large(url, self.config, self.logger)
+                        return _to_response(url, resp.status, content if resp.ok else None, self.logger)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(_backoff(self.config, attempt))
+
+    async def _read_body(self, resp):
+        # _read_body() for an aiohttp reply
+        limit = self.config.max_response_bytes
+        if limit and resp.content_length is not None and resp.content_length > limit:
+            resp.close()
+            return None
+        body = bytearray()
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            body += chunk
+            if limit and len(body) > limit:
+                resp.close()
+                return None
+        return bytes(body)
@@ -0,0 +1,131 @@
+import os
+import struct
+from collections import Counter
+from functools import lru_cache
+from hashlib import blake2b
+from threading import Lock
+
+from utils.seen_set import DigestSet
+
+BITS = 64
+# each of the 64 bit positions gets its own lane of LANE bits in one big int,
+# wide enough for the token count of any real page
+LANE = 24
+LANE_MASK = (1 << LANE) - 1
+RECORD = struct.Struct("<Q8s")
+
+
+def content_checksum(tokens):
+    """fingerprint of a page's visible text, equal for pages with the same words"""
+    return blake2b(" ".join(tokens).encode("utf-8"), digest_size=8).digest()
+
+
+@lru_cache(maxsize=1 << 16)
+def _spread_token_hash(token):
+    # 64-bit hash of token with bit i moved to the bottom of lane i
+    h = int.from_bytes(blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    spread = 0
+    for i in range(BITS):
+        if h >> i & 1:
+            spread |= 1 << (i * LANE)
+    return spread
+
+
+def simhash(tokens):
+    """
+    64-bit SimHash of a token sequence, weighted by token frequency. Pages that
+    share most of their words get fingerprints a few bits apart.
+
+    Time Complexity: O(n + u * 64) - u unique tokens, whose lane-spread hashes are cached
+    """
+    counts = Counter(tokens)
+    if not counts:
+        return 0
+    # one big-int multiply-add per unique token adds its weight to every
+    # lane whose bit is set, instead of 64 separate additions
+    lanes = 0
+    for token, count in counts.items():
+        lanes += count * _spread_token_hash(token)
+    total = sum(counts.values())
+    fingerprint = 0
+    for i in range(BITS):
+        if 2 * (lanes >> (i * LANE) & LANE_MASK) > total:
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+class DuplicateDetector(object):
+    """
+    Finds pages whose content was already crawled: exact copies by checksum,
+    near copies by SimHash within max_distance bits.
+
+    Fingerprints are split into max_distance + 1 bands. Two fingerprints at
+    most max_distance bits apart agree on at least one whole band, so a lookup
+    only compares against pages that share a band value. Every new page's
+    fingerprint is appended to path, next to the frontier's save file.
+    """
+    def __init__(self, path=None, max_distance=3):
+        self.path = path
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = BITS // self.bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.index = [dict() for _ in range(self.bands)]
+        self.checksums = DigestSet()
+        self.lock = Lock()
+        self.file = None
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                data = f.read()
+            # a torn last record is dropped
+            for offset in range(0, len(data) - RECORD.size + 1, RECORD.size):
+                fingerprint, checksum = RECORD.unpack_from(data, offset)
+                self._add(fingerprint, checksum)
+
+    def open(self, restart=False):
+        if self.path:
+            self.file = open(self.path, "wb" if restart else "ab")
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def _band_keys(self, fingerprint):
+        return [(fingerprint >> (band * self.band_bits)) & self.band_mask for band in range(self.bands)]
+
+    def _add(self, fingerprint, checksum):
+        self.checksums.add(checksum)
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            self.index[band].setdefault(key, []).append(fingerprint)
+
+    def _near(self, fingerprint):
+        for band, key in enumerate(self._band_keys(fingerprint)):
+            for other in self.index[band].get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return True
+        return False
+
+    def check_and_add(self, tokens):
+        """
+        Returns (is_duplicate, checksum) for a page's tokens and remembers the
+        page if it is new.
+        """
+        checksum = content_checksum(tokens)
+        if checksum in self.checksums:
+            return True, checksum
+        return self.check_and_add_fingerprint(checksum, simhash(tokens)), checksum
+
+    def check_and_add_fingerprint(self, checksum, fingerprint):
+        """same as check_and_add() for a page fingerprinted elsewhere, e.g. in a parser process"""
+        with self.lock:
+            if checksum in self.checksums or self._near(fingerprint):
+                return True
+            self._add(fingerprint, checksum)
+            if self.file:
+                self.file.write(RECORD.pack(fingerprint, checksum))
+                self.file.flush()
+        return False
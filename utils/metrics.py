@@ -0,0 +1,253 @@
+import cProfile
+import json
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.crawl_stats import write_atomic
+
+# histogram bucket upper bounds in seconds, 0.1ms to 60s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _ThreadMetrics(object):
+    """one thread's counters and histograms, its lock is only contended by snapshots"""
+    __slots__ = ("lock", "counters", "histograms")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, label) -> count
+        self.counters = dict()
+        # name -> [bucket counts..., +Inf count, sum]
+        self.histograms = dict()
+
+
+class Metrics(object):
+    """
+    Counters and timing histograms for the crawl's hot paths.
+
+    Every thread records into its own store, so recording costs a clock read
+    and an uncontended lock; snapshot() adds the stores up. Counters may have
+    a label, e.g. the exception type of an error.
+    """
+    def __init__(self):
+        self.local = threading.local()
+        self.stores = list()
+        self.stores_lock = threading.Lock()
+        self.started = time.time()
+
+    def _store(self):
+        store = getattr(self.local, "store", None)
+        if store is None:
+            store = self.local.store = _ThreadMetrics()
+            with self.stores_lock:
+                self.stores.append(store)
+        return store
+
+    def count(self, name, label=None, amount=1):
+        store = self._store()
+        key = (name, label)
+        with store.lock:
+            store.counters[key] = store.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds):
+        store = self._store()
+        with store.lock:
+            histogram = store.histograms.get(name)
+            if histogram is None:
+                histogram = store.histograms[name] = [0] * (len(BUCKETS) + 2)
+            histogram[bisect_left(BUCKETS, seconds)] += 1
+            histogram[-1] += seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """returns ({(name, label): count}, {name: [bucket counts..., +Inf count, sum]})"""
+        counters = dict()
+        histograms = dict()
+        with self.stores_lock:
+            stores = list(self.stores)
+        for store in stores:
+            with store.lock:
+                for key, value in store.counters.items():
+                    counters[key] = counters.get(key, 0) + value
+                for name, histogram in store.histograms.items():
+                    total = histograms.setdefault(name, [0] * (len(BUCKETS) + 2))
+                    for i, value in enumerate(histogram):
+                        total[i] += value
+        return counters, histograms
+
+    def to_json(self):
+        counters, histograms = self.snapshot()
+        data = {"uptime_seconds": round(time.time() - self.started, 1), "counters": {}, "timers": {}}
+        for (name, label), value in sorted(counters.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            if label is None:
+                data["counters"][name] = value
+            else:
+                data["counters"].setdefault(name, {})[label] = value
+        for name, histogram in sorted(histograms.items()):
+            count = sum(histogram[:-1])
+            data["timers"][name] = {
+                "count": count,
+                "total_seconds": round(histogram[-1], 6),
+                "mean_ms": round(histogram[-1] / count * 1e3, 3) if count else 0,
+                "p50_ms": _quantile_ms(histogram, 0.5),
+                "p99_ms": _quantile_ms(histogram, 0.99),
+            }
+        return json.dumps(data, indent=4)
+
+    def to_prometheus(self, prefix="crawler"):
+        counters, histograms = self.snapshot()
+        lines = []
+        for (name, label), value in sorted(counters.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            labels = f'{{type="{label}"}}' if label is not None else ""
+            lines.append(f"{prefix}_{name}_total{labels} {value}")
+        for name, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, value in zip(BUCKETS, histogram):
+                cumulative += value
+                lines.append(f'{prefix}_{name}_seconds_bucket{{le="{bound}"}} {cumulative}')
+            cumulative += histogram[len(BUCKETS)]
+            lines.append(f'{prefix}_{name}_seconds_bucket{{le="+Inf"}} {cumulative}')
+            lines.append(f"{prefix}_{name}_seconds_sum {histogram[-1]:.6f}")
+            lines.append(f"{prefix}_{name}_seconds_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _quantile_ms(histogram, fraction):
+    # upper bound of the bucket holding the quantile, like histogram_quantile without interpolation
+    count = sum(histogram[:-1])
+    if not count:
+        return 0
+    rank = fraction * count
+    seen = 0
+    for bound, value in zip(BUCKETS, histogram):
+        seen += value
+        if seen >= rank:
+            return bound * 1e3
+    return float("inf")
+
+
+class Profiler(object):
+    """
+    Runs a sample_rate share of worker iterations under cProfile and adds them
+    up, so a long crawl can be profiled without slowing every page down.
+    """
+    def __init__(self, path=None, sample_rate=0.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+        self.stats = None
+        self.samples = 0
+
+    @contextmanager
+    def maybe_profile(self):
+        if not self.path or not self.sample_rate or random.random() >= self.sample_rate:
+            yield
+            return
+        # cProfile only sees the thread that enabled it
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                self.samples += 1
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+
+    def dump(self):
+        with self.lock:
+            if self.stats is not None:
+                self.stats.dump_stats(self.path)
+
+
+class MetricsExporter(object):
+    """
+    Writes metrics to path every seconds (JSON if path ends with .json,
+    Prometheus text otherwise) and, with a port, serves /metrics (Prometheus
+    text) and /metrics.json on localhost.
+    """
+    def __init__(self, metrics, path=None, seconds=10.0, port=0):
+        self.metrics = metrics
+        self.path = path
+        self.seconds = seconds
+        self.port = port
+        self.stopped = threading.Event()
+        self.writer = None
+        self.server = None
+
+    def render(self):
+        if self.path.endswith(".json"):
+            return self.metrics.to_json()
+        return self.metrics.to_prometheus()
+
+    def start(self):
+        if self.path:
+            self.writer = threading.Thread(target=self._run, daemon=True)
+            self.writer.start()
+        if self.port:
+            self.server = ThreadingHTTPServer(("localhost", self.port), _MetricsHandler)
+            self.server.daemon_threads = True
+            self.server.metrics = self.metrics
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.seconds):
+            write_atomic(self.path, self.render())
+
+    def close(self):
+        self.stopped.set()
+        if self.writer is not None:
+            self.writer.join()
+            write_atomic(self.path, self.render())
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = self.server.metrics.to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = self.server.metrics.to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# shared by every module, like a logger
+metrics = Metrics()
+profiler = Profiler()
+
+
+def configure(config):
+    # applies config.ini options, returns the exporter to close at shutdown
+    profiler.path = config.profile_file
+    profiler.sample_rate = config.profile_sample_rate
+    return MetricsExporter(metrics, config.metrics_file, config.metrics_seconds, config.metrics_port).start()
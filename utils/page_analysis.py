@@ -0,0 +1,126 @@
+from collections import namedtuple
+from urllib.parse import urljoin, urldefrag
+from bs4 import BeautifulSoup
+from lxml import etree
+from utils.tokenizer import tokenize
+from utils.metrics import metrics
+
+# tags whose text is never shown to a reader
+NON_VISIBLE_TAGS = ["script", "style", "noscript"]
+
+# names accepted by the PARSER option in config.ini
+PARSER_ENGINES = ["stream", "bs4"]
+
+PageAnalysis = namedtuple("PageAnalysis", [
+    "url",            # final url of the page (resp.url)
+    "text",           # visible text of the page
+    "tokens",         # tokens of the visible text
+    "links",          # absolute, defragmented hrefs in document order
+    "content_length", # size of the raw body in bytes
+    "word_count",     # number of tokens
+    "text_ratio",     # word_count / content_length
+])
+
+EMPTY_ANALYSIS = PageAnalysis(None, "", (), (), 0, 0, 0.0)
+
+
+class _StreamTarget(object):
+    """lxml parser target that keeps hrefs and visible text, no tree is built"""
+    def __init__(self):
+        self.hrefs = []
+        self.parts = []
+        self.hidden_depth = 0
+
+    def start(self, tag, attrib):
+        if tag in NON_VISIBLE_TAGS:
+            self.hidden_depth += 1
+        elif tag == "a":
+            href = attrib.get("href")
+            if href:
+                self.hrefs.append(href)
+        # a tag boundary separates text the same way get_text(separator=' ') does
+        self.parts.append(" ")
+
+    def end(self, tag):
+        if tag in NON_VISIBLE_TAGS and self.hidden_depth:
+            self.hidden_depth -= 1
+        self.parts.append(" ")
+
+    def data(self, data):
+        # lxml may split one text node over several calls (e.g. around entities)
+        if not self.hidden_depth:
+            self.parts.append(data)
+
+    def close(self):
+        return self
+
+
+def _stream_extract(content):
+    """returns (hrefs, visible text) in a single streaming pass over content"""
+    parser = etree.HTMLParser(target=_StreamTarget())
+    try:
+        # lxml falls back to latin-1 when the page declares no charset
+        parser.feed(content.decode("utf-8") if isinstance(content, bytes) else content)
+    except UnicodeDecodeError:
+        parser.feed(content)
+    target = parser.close()
+    return target.hrefs, "".join(target.parts)
+
+
+def _soup_extract(content):
+    """returns (hrefs, visible text) using a full BeautifulSoup tree"""
+    soup = BeautifulSoup(content, 'lxml')
+
+    # links are collected before the non-visible tags are removed, an <a>
+    # inside <noscript> is still a link
+    hrefs = [link.get('href') for link in soup.find_all('a') if link.get('href')]
+
+    for tag in soup(NON_VISIBLE_TAGS):
+        tag.decompose()
+
+    return hrefs, soup.get_text(separator=' ')
+
+
+def analyze_page(resp, engine="stream"):
+    """
+    Parses the response body exactly once and returns an immutable PageAnalysis
+    holding everything the scraper needs (stats, content quality and links).
+
+    :param resp: utils.response.Response returned by the cache server
+    :param engine: "stream" for the lxml target parser, "bs4" for BeautifulSoup.
+        The stream engine falls back to BeautifulSoup on pages lxml cannot handle.
+    Time Complexity: O(n) - one parse plus one walk over the tree
+    """
+    if resp.raw_response is None or resp.raw_response.content is None:
+        return EMPTY_ANALYSIS._replace(url=resp.url)
+
+    content = resp.raw_response.content
+    hrefs, text = None, None
+    if engine == "stream":
+        try:
+            hrefs, text = _stream_extract(content)
+        except (etree.LxmlError, ValueError):
+            pass
+        # malformed pages can make lxml give up early and return nothing
+        if not hrefs and not (text and text.strip()):
+            hrefs, text = None, None
+    if text is None:
+        hrefs, text = _soup_extract(content)
+
+    links = []
+    for href in hrefs:
+        absolute_url, _ = urldefrag(urljoin(resp.url, href))
+        links.append(absolute_url)
+
+    with metrics.timer("tokenize"):
+        tokens = tuple(tokenize(text))
+    word_count = len(tokens)
+    content_length = len(content)
+    return PageAnalysis(
+        url=resp.url,
+        text=text,
+        tokens=tokens,
+        links=tuple(links),
+        content_length=content_length,
+        word_count=word_count,
+        text_ratio=word_count / max(content_length, 1)) # max used to prevent division by 0
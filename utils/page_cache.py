@@ -0,0 +1,102 @@
+import os
+import pickle
+import sqlite3
+import time
+from hashlib import blake2b
+from threading import Lock
+
+from utils.canonical_url import url_key
+
+# the cache server's answer for a page that did not change
+NOT_MODIFIED = 304
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    urlhash TEXT PRIMARY KEY,
+    content_hash BLOB,
+    etag TEXT,
+    last_modified TEXT,
+    result BLOB NOT NULL
+);
+"""
+
+
+def _validators(resp):
+    # (ETag, Last-Modified, content hash) of a downloaded page
+    raw = resp.raw_response
+    if raw is None:
+        return None, None, None
+    headers = getattr(raw, "headers", None) or {}
+    content = getattr(raw, "content", None)
+    content_hash = blake2b(content, digest_size=16).digest() if content else None
+    return headers.get("ETag"), headers.get("Last-Modified"), content_hash
+
+
+class PageCache(object):
+    """
+    What every crawled page yielded (the scraper's PageResult: word counts,
+    fingerprints and links) with its ETag, Last-Modified and a hash of its
+    body, kept in SQLite between crawls. A re-crawl (launch.py --recrawl)
+    reuses the saved result of a page that did not change instead of parsing
+    it again.
+
+    A page is unchanged when the reply is a 304, when its strong ETag or its
+    Last-Modified equals the saved one, or when its body hashes the same.
+    Writes are committed every batch_size pages or batch_seconds.
+    """
+    def __init__(self, path, restart=False, batch_size=500, batch_seconds=1.0):
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.uncommitted = 0
+        self.last_commit = time.monotonic()
+        self.lock = Lock()
+        if restart:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.execute("BEGIN")
+
+    def lookup(self, url, resp):
+        """the saved result tuple of url if resp shows the page is unchanged, else None"""
+        if resp.status not in (200, NOT_MODIFIED):
+            return None
+        with self.lock:
+            row = self.db.execute(
+                "SELECT content_hash, etag, last_modified, result FROM pages WHERE urlhash = ?",
+                (url_key(url),)).fetchone()
+        if row is None:
+            return None
+        saved_hash, saved_etag, saved_modified, result = row
+        if resp.status != NOT_MODIFIED:
+            etag, modified, content_hash = _validators(resp)
+            # a weak ETag ("W/...") only promises an equivalent page
+            same_etag = etag is not None and not etag.startswith("W/") and etag == saved_etag
+            same_modified = modified is not None and modified == saved_modified
+            if not (same_etag or same_modified or (content_hash is not None and content_hash == saved_hash)):
+                return None
+        return pickle.loads(result)
+
+    def store(self, url, resp, result):
+        """saves the result of a page parsed in this crawl"""
+        etag, modified, content_hash = _validators(resp)
+        row = (url_key(url), content_hash, etag, modified, pickle.dumps(tuple(result)))
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)", row)
+            self.uncommitted += 1
+            if (self.uncommitted >= self.batch_size
+                    or time.monotonic() - self.last_commit >= self.batch_seconds):
+                self.db.execute("COMMIT")
+                self.db.execute("BEGIN")
+                self.uncommitted = 0
+                self.last_commit = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.execute("COMMIT")
+                self.db.close()
+                self.db = None
@@ -0,0 +1,97 @@
+import asyncio
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# the parts of a Response the scraper reads; the raw requests.Response is
+# stripped down to its url and content before it is sent to a parser process
+RawPage = namedtuple("RawPage", ["url", "content"])
+PageResponse = namedtuple("PageResponse", ["url", "status", "error", "raw_response"])
+
+_engine = "stream"
+
+
+def _init_parser(engine, config):
+    global _engine
+    _engine = engine
+    if config is not None:
+        import scraper
+        scraper.configure_analysis(config)
+
+
+def _analyze(url, resp):
+    # runs in the parser process, which imports scraper on first use
+    import scraper
+    return scraper.analyze_response(url, resp, _engine)
+
+
+def _rejected(resp):
+    # pages scraper.accept_response turns down are never sent to a process,
+    # a too large one is not even unpickled
+    import scraper
+    if resp.status == 200 and not scraper.accept_response(resp):
+        return scraper.FAILED_FETCH
+    return None
+
+
+def strip_response(resp):
+    raw = resp.raw_response
+    if raw is not None:
+        raw = RawPage(getattr(raw, "url", resp.url), getattr(raw, "content", None))
+    return PageResponse(resp.url, resp.status, resp.error, raw)
+
+
+class ParsePool(object):
+    """
+    Pool of parser processes running scraper.analyze_response, so parsing and
+    tokenizing are not serialized by the GIL. Worker threads send each
+    downloaded page's bytes and get back a scraper.PageResult to record.
+
+    Processes are spawned rather than forked, the crawler already runs
+    threads when the first page is sent.
+    """
+    def __init__(self, processes, engine="stream", config=None):
+        # with config, the processes fetch robots.txt like the crawler does
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(
+            processes, mp_context=get_context("spawn"),
+            initializer=_init_parser, initargs=(engine, config))
+
+    def analyze(self, url, resp):
+        """blocks the calling thread until the page is analyzed"""
+        rejected = _rejected(resp)
+        if rejected is not None:
+            return rejected
+        return self.executor.submit(_analyze, url, strip_response(resp)).result()
+
+    async def analyze_async(self, url, resp):
+        rejected = _rejected(resp)
+        if rejected is not None:
+            return rejected
+        return await asyncio.wrap_future(self.executor.submit(_analyze, url, strip_response(resp)))
+
+    def analyze_many(self, pages, window=64):
+        """
+        analyzes an iterable of (url, resp) in the processes and yields
+        (url, resp, result) in the same order, with at most window pages in flight
+        """
+        pending = deque()
+        for url, resp in pages:
+            result = _rejected(resp)
+            if result is None:
+                result = self.executor.submit(_analyze, url, strip_response(resp))
+            pending.append((url, resp, result))
+            if len(pending) >= window:
+                yield self._done(*pending.popleft())
+        while pending:
+            yield self._done(*pending.popleft())
+
+    @staticmethod
+    def _done(url, resp, result):
+        if not isinstance(result, tuple):
+            # a future of a page sent to a process
+            result = result.result()
+        return url, resp, result
+
+    def close(self):
+        self.executor.shutdown()
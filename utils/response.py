@@ -1,14 +1,49 @@
 import pickle
 
 class Response(object):
+    """
+    A cache server reply. The page (raw_response, a pickled requests.Response)
+    is kept as the bytes it arrived as and only unpickled the first time
+    raw_response is read, so url, status, error and payload_size can be
+    checked before the body is materialized.
+    """
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self.payload = resp_dict["response"] if "response" in resp_dict else None
+        # bytes of the pickled page, its body plus a few hundred bytes of headers
+        self.payload_size = len(self.payload) if isinstance(self.payload, (bytes, bytearray)) else 0
+        self._raw_response = None
+        self._decoded = self.payload is None
+
+    @property
+    def raw_response(self):
+        if not self._decoded:
+            try:
+                self._raw_response = pickle.loads(self.payload)
+            except TypeError:
+                self._raw_response = None
+            # the pickled copy is not needed anymore
+            self.payload = None
+            self._decoded = True
+        return self._raw_response
+
+
+def content_size(resp):
+    """size of resp's page in bytes, without unpickling it when resp is a Response"""
+    if isinstance(resp, Response):
+        return resp.payload_size
+    raw = resp.raw_response
+    content = getattr(raw, "content", None) if raw is not None else None
+    return len(content) if content else 0
+
+
+def content_type(resp):
+    """media type of resp's page in lower case without parameters, None when it has no Content-Type"""
+    raw = resp.raw_response
+    headers = getattr(raw, "headers", None) if raw is not None else None
+    value = headers.get("Content-Type") if headers else None
+    if not value:
+        return None
+    return value.split(";", 1)[0].strip().lower()
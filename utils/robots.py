@@ -0,0 +1,203 @@
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class RobotsRules(object):
+    """
+    The robots.txt rules that apply to one user agent on one host, compiled
+    into a single regex. Every Allow/Disallow pattern is one alternative,
+    ordered longest first with Allow before Disallow at equal length, so the
+    first alternative that matches is the rule robots.txt says wins.
+    """
+    def __init__(self, rules=(), crawl_delay=None):
+        # rules: (allow, pattern) pairs as written in robots.txt
+        self.crawl_delay = crawl_delay
+        ordered = sorted(rules, key=lambda rule: (-len(rule[1]), not rule[0]))
+        self.allows = [allow for allow, _ in ordered]
+        alternatives = [f"(?P<r{i}>{_pattern_regex(pattern)})" for i, (_, pattern) in enumerate(ordered)]
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def allowed(self, path):
+        if self.regex is None:
+            return True
+        match = self.regex.match(path)
+        if match is None:
+            return True
+        return self.allows[int(match.lastgroup[1:])]
+
+    @classmethod
+    def parse(cls, text, user_agent):
+        """
+        Parses robots.txt text and keeps the group of the most specific
+        user-agent line contained in user_agent, or the "*" group.
+        """
+        groups = dict()
+        agents = []
+        in_rules = False
+        for line in text.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            field, value = line.split(":", 1)
+            field, value = field.strip().lower(), value.strip()
+            if field == "user-agent":
+                # a user-agent line after rules starts a new group
+                if in_rules:
+                    agents = []
+                    in_rules = False
+                agents.append(value.lower())
+                continue
+            if field not in ("allow", "disallow", "crawl-delay") or not agents:
+                continue
+            in_rules = True
+            for agent in agents:
+                rules, delay = groups.get(agent, ([], None))
+                if field == "crawl-delay":
+                    try:
+                        delay = float(value)
+                    except ValueError:
+                        pass
+                elif value:
+                    # an empty Disallow allows everything and adds no rule
+                    rules.append((field == "allow", value))
+                groups[agent] = (rules, delay)
+
+        user_agent = user_agent.lower()
+        matching = [agent for agent in groups if agent != "*" and agent in user_agent]
+        agent = max(matching, key=len) if matching else "*"
+        rules, delay = groups.get(agent, ([], None))
+        return cls(rules, delay)
+
+
+def _pattern_regex(pattern):
+    # "*" matches any run of characters, a trailing "$" anchors the end
+    anchored = pattern.endswith("$")
+    if anchored:
+        pattern = pattern[:-1]
+    regex = ".*".join(re.escape(part) for part in pattern.split("*"))
+    return regex + (r"\Z" if anchored else "")
+
+
+# parsed rules that allow everything, for hosts without a robots.txt
+ALLOW_ALL = RobotsRules()
+# seconds before a robots.txt that could not be fetched is tried again
+RETRY_SECONDS = 300.0
+
+
+class RobotsCache(object):
+    """
+    Fetches, compiles and caches robots.txt per host for ttl seconds.
+    lookup(url) answers "may url be crawled" and the host's crawl-delay in
+    one call.
+
+    fetch(robots_url) returns (status, text). A missing robots.txt (4xx)
+    allows everything. When it cannot be fetched at all (5xx, a cache server
+    error or an exception) the host gets no rules for RETRY_SECONDS and
+    lookup() returns allowed=None, so the caller can fall back to its own
+    rules. An expired entry keeps answering while one thread refetches it.
+    """
+    def __init__(self, fetch, user_agent, ttl=86400.0):
+        self.fetch = fetch
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # host -> (RobotsRules or None, expires at)
+        self.hosts = dict()
+        # host -> Event set once its first fetch is done
+        self.fetching = dict()
+        # counts the rules stored, verdicts memoized under an older value are stale
+        self.generation = 0
+        # host -> Crawl-delay another process read from the host's robots.txt
+        self.noted_delays = dict()
+
+    def _fetch_rules(self, scheme, host):
+        try:
+            status, text = self.fetch(f"{scheme}://{host}/robots.txt")
+        except Exception:
+            return None
+        if status == 200:
+            return RobotsRules.parse(text or "", self.user_agent)
+        if 400 <= status < 500:
+            return ALLOW_ALL
+        return None
+
+    def _rules(self, scheme, host):
+        now = time.monotonic()
+        # a fresh entry is read without the lock, dict reads are atomic
+        entry = self.hosts.get(host)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+            event = self.fetching.get(host)
+            owner = event is None
+            if owner:
+                event = self.fetching[host] = threading.Event()
+        if not owner:
+            if entry is not None:
+                # stale rules while another thread refreshes them
+                return entry[0]
+            event.wait()
+            with self.lock:
+                return self.hosts[host][0]
+        rules = None
+        try:
+            rules = self._fetch_rules(scheme, host)
+        finally:
+            with self.lock:
+                ttl = self.ttl if rules is not None else min(self.ttl, RETRY_SECONDS)
+                self.hosts[host] = (rules, time.monotonic() + ttl)
+                self.generation += 1
+                del self.fetching[host]
+            event.set()
+        return rules
+
+    def _cached_rules(self, host):
+        # the rules of host if its robots.txt was fetched, stale or not
+        entry = self.hosts.get(host)
+        return entry[0] if entry is not None else None
+
+    def lookup(self, url):
+        """returns (allowed, crawl_delay); allowed is None when the host's robots.txt is unknown"""
+        parsed = urlsplit(url)
+        return self.check(parsed.scheme, parsed.netloc, parsed.path, parsed.query)
+
+    def check(self, scheme, netloc, path, query="", fetch=True):
+        """lookup() for a url that is already split; with fetch False only cached rules are read"""
+        rules = self._rules(scheme or "https", netloc.lower()) if fetch else self._cached_rules(netloc.lower())
+        if rules is None:
+            return None, None
+        path = path or "/"
+        if query:
+            path = f"{path}?{query}"
+        return rules.allowed(path), rules.crawl_delay
+
+    def crawl_delay(self, host):
+        """cached crawl-delay of host, never fetches"""
+        entry = self.hosts.get(host)
+        if entry is None or entry[0] is None:
+            return self.noted_delays.get(host)
+        return entry[0].crawl_delay
+
+    def note_crawl_delay(self, host, delay):
+        """the crawl-delay of host as a parser process, which fetched its robots.txt, read it"""
+        self.noted_delays[host] = delay
+
+
+def make_robots_fetch(config, download_func=None):
+    """returns a fetch function for RobotsCache that goes through the cache server"""
+    if download_func is None:
+        from utils.download import download as download_func
+
+    def fetch(robots_url):
+        resp = download_func(robots_url, config)
+        raw = resp.raw_response
+        content = getattr(raw, "content", None) if raw is not None else None
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", errors="replace")
+        return resp.status, content
+    return fetch
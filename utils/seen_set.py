@@ -0,0 +1,162 @@
+import math
+from threading import Lock
+
+EMPTY = 0
+
+
+class _DigestTable(object):
+    """open-addressing hash table of fixed-width digests packed in one bytearray"""
+    def __init__(self, digest_size, slots=1024):
+        self.digest_size = digest_size
+        self.slots = slots
+        self.count = 0
+        self.table = bytearray(slots * digest_size)
+        self.empty = bytes(digest_size)
+
+    def _find(self, digest):
+        # linear probing from the slot picked by the digest's leading bytes
+        size = self.digest_size
+        mask = self.slots - 1
+        slot = int.from_bytes(digest[:8], "little") & mask
+        table = self.table
+        while True:
+            offset = slot * size
+            stored = table[offset:offset + size]
+            if stored == digest or stored == self.empty:
+                return offset, stored == digest
+            slot = (slot + 1) & mask
+
+    def add(self, digest):
+        offset, found = self._find(digest)
+        if found:
+            return False
+        self.table[offset:offset + self.digest_size] = digest
+        self.count += 1
+        if self.count * 10 > self.slots * 7:
+            self._grow()
+        return True
+
+    def __contains__(self, digest):
+        return self._find(digest)[1]
+
+    def _grow(self):
+        size = self.digest_size
+        old = self.table
+        self.slots *= 2
+        self.table = bytearray(self.slots * size)
+        for offset in range(0, len(old), size):
+            digest = old[offset:offset + size]
+            if digest != self.empty:
+                new_offset, _ = self._find(digest)
+                self.table[new_offset:new_offset + size] = digest
+
+
+class DigestSet(object):
+    """
+    Set of url digests that stores each member as digest_size raw bytes in a
+    bytearray instead of a Python str or bytes object, about 12 to 23 bytes
+    per url for 8-byte digests instead of well over 100.
+
+    Members must be bytes of at least digest_size (e.g. sha256(...).digest());
+    only the first digest_size bytes are kept. The table is split into
+    stripes with their own locks so it can be shared between threads.
+    """
+    def __init__(self, digest_size=8, stripes=16):
+        self.digest_size = digest_size
+        self.stripes = [(_DigestTable(digest_size), Lock()) for _ in range(stripes)]
+
+    def _key(self, digest):
+        digest = bytes(digest[:self.digest_size])
+        # the all-zero digest marks an empty slot
+        if not any(digest):
+            digest = b"\x01" + digest[1:]
+        return digest, self.stripes[digest[-1] % len(self.stripes)]
+
+    def add(self, digest):
+        """adds digest, returns False if it was already in the set"""
+        digest, (table, lock) = self._key(digest)
+        with lock:
+            return table.add(digest)
+
+    def __contains__(self, digest):
+        digest, (table, lock) = self._key(digest)
+        with lock:
+            return digest in table
+
+    def __len__(self):
+        return sum(table.count for table, _ in self.stripes)
+
+
+class BloomFilter(object):
+    """fixed size Bloom filter over digests, using double hashing for the k probes"""
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.bits / capacity * math.log(2))))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, digest):
+        array = self.array
+        return all(array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    def add(self, digest):
+        added = False
+        array = self.array
+        for pos in self._positions(digest):
+            if not array[pos >> 3] & (1 << (pos & 7)):
+                array[pos >> 3] |= 1 << (pos & 7)
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class ScalableBloomFilter(object):
+    """
+    Bloom filter that adds a larger, tighter filter whenever the current one is
+    full, so the overall false positive rate stays under error_rate however
+    many urls are added. Needs digests of at least 16 bytes.
+    """
+    def __init__(self, initial_capacity=100000, error_rate=0.0001, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.lock = Lock()
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - tightening))]
+
+    def __contains__(self, digest):
+        return any(digest in bloom for bloom in self.filters)
+
+    def add(self, digest):
+        """adds digest, returns False if it was (probably) already in the set"""
+        with self.lock:
+            if digest in self:
+                return False
+            bloom = self.filters[-1]
+            if bloom.count >= bloom.capacity:
+                bloom = BloomFilter(
+                    bloom.capacity * self.growth, bloom.error_rate * self.tightening)
+                self.filters.append(bloom)
+            bloom.add(digest)
+            return True
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+
+def make_seen_set(kind="digest", error_rate=0.0001):
+    """
+    :param kind: "digest" for an exact DigestSet, "bloom" for a ScalableBloomFilter
+    :param error_rate: false positive rate of the Bloom filter
+    """
+    if kind == "bloom":
+        return ScalableBloomFilter(error_rate=error_rate)
+    return DigestSet()
@@ -1,6 +1,8 @@
+import re
 import sys
+from collections import Counter
 
-STOPWORDS = [
+STOPWORDS = frozenset([
     "a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "aren't",
     "as", "at", "be", "because", "been", "before", "being", "below", "between", "both", "but", "by",
     "can't", "cannot", "could", "couldn't", "did", "didn't", "do", "does", "doesn't", "doing", "don't",
@@ -17,50 +19,77 @@ STOPWORDS = [
     "where", "where's", "which", "while", "who", "who's", "whom", "why", "why's", "with", "won't",
     "would", "wouldn't", "you", "you'd", "you'll", "you're", "you've", "your", "yours", "yourself",
     "yourselves", "a","b","c","d","e","f","g","h","i","j","k","l","m","n","o","p","q","r","s","t","u","v", "w","x","y","z", "'"
-]
+])
+
+# characters that go into a token: those whose lowercase form sorts between
+# 'a' and 'z' (ascii letters, the dotted capital I and the Kelvin sign),
+# ascii digits and the apostrophe
+TOKEN_CHARS = "A-Za-z0-9'\u0130\u212a"
+TOKEN_PATTERN = re.compile(f"[{TOKEN_CHARS}]+")
+TOKEN_CHAR = re.compile(f"[{TOKEN_CHARS}]")
+
+def _lower_all(raw_tokens):
+    # tokens never contain spaces, so one lower() call covers all of them
+    if not raw_tokens:
+        return []
+    return " ".join(raw_tokens).lower().split(" ")
 
 def tokenize(readable_text):
     """
     Docstring for tokenize
     
-    :param file_path: path of text file to tokenize
-    Time Complexity: O(n) - Reads through text of file one time character by character
-    """
-    tokens = []
-    token = ""
+    :param readable_text: text to tokenize
+    Time Complexity: O(n) - One regex pass over the text, then one lower() over the tokens
 
+    Tokens made only of digits are dropped, except for a token that runs to the
+    end of the text.
+    """
     try:
-        for char in readable_text:
-            if ('a' <= char.lower() <= 'z') or ('0' <= char <= '9') or char == "'":
-                token += char.lower()
-            else:
-                if token:
-                    if not token.isdigit():
-                        tokens.append(token)
-                    token = ""
-        if token:
-            tokens.append(token)
+        tokens = _lower_all(TOKEN_PATTERN.findall(readable_text))
     except Exception:
         return []
 
+    if not tokens:
+        return tokens
+    last = tokens[-1] if TOKEN_CHAR.match(readable_text[-1]) else None
+    tokens = [token for token in tokens if not token.isdigit()]
+    if last is not None and last.isdigit():
+        tokens.append(last)
     return tokens
 
+def tokenize_stream(chunks):
+    """
+    Docstring for tokenize_stream
+    
+    :param chunks: iterable of text pieces, e.g. the text nodes of a page
+    Time Complexity: O(n) - Same as tokenize(), yields the tokens of "".join(chunks)
+    without building the joined text
+    """
+    carry = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        text = carry + chunk
+        raw_tokens = TOKEN_PATTERN.findall(text)
+        # a token touching the end of the chunk may continue in the next one
+        carry = raw_tokens.pop() if raw_tokens and TOKEN_CHAR.match(text[-1]) else ""
+        for token in _lower_all(raw_tokens):
+            if not token.isdigit():
+                yield token
+    if carry:
+        yield carry.lower()
+
 def compute_word_frequencies(tokens_list):
     """
     Docstring for compute_word_frequencies
     
     :param tokens_list: list of tokens from tokenize()
-    Time Complexity: O(n) - Iterates through tokens_list once
+    Time Complexity: O(n) - Counts tokens_list once, then drops the stopwords among
+    the unique tokens
     """
-    token_freqs = {}
-
-    for token in tokens_list:
-        if token in STOPWORDS:
-            continue
-        if token in token_freqs:
-            token_freqs[token] += 1
-        else:
-            token_freqs[token] = 1
+    token_freqs = Counter(tokens_list)
+    for token in STOPWORDS.intersection(token_freqs):
+        del token_freqs[token]
 
     return token_freqs
 
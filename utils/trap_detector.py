@@ -0,0 +1,87 @@
+import json
+import os
+from threading import Lock
+
+from utils.crawl_stats import write_atomic
+
+
+class PatternStats(object):
+    """what fetching urls of one url pattern has produced so far"""
+    __slots__ = ("fetches", "checksums", "useful_words")
+
+    def __init__(self):
+        self.fetches = 0
+        # a pattern is fetched at most MAX_URL_PATTERN_HITS times, so this stays small
+        self.checksums = set()
+        self.useful_words = 0
+
+    def distinct_ratio(self):
+        return len(self.checksums) / max(self.fetches, 1)
+
+    def avg_useful_words(self):
+        return self.useful_words / max(self.fetches, 1)
+
+
+class TrapDetector(object):
+    """
+    Learns which url patterns (utils.url_pattern_detection) are traps from
+    what their pages actually contain.
+
+    For every pattern it tracks the number of fetches, the share of fetches
+    that returned content not seen before for that pattern and the average
+    number of useful (non stopword) words. Once a pattern has min_fetches
+    fetches and either value falls below its threshold, the pattern is
+    quarantined: its urls are no longer queued or downloaded. Quarantined
+    patterns are saved to path so a restarted crawl starts out knowing them.
+    """
+    def __init__(self, path=None, min_fetches=20, min_distinct_ratio=0.2, min_avg_words=30):
+        self.path = path
+        self.min_fetches = min_fetches
+        self.min_distinct_ratio = min_distinct_ratio
+        self.min_avg_words = min_avg_words
+        self.lock = Lock()
+        self.patterns = dict()
+        self.quarantined = set()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                self.quarantined = set(json.load(f)["quarantined"])
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = {"quarantined": sorted(self.quarantined)}
+        write_atomic(self.path, json.dumps(data, indent=4))
+
+    def is_quarantined(self, pattern_hash):
+        return pattern_hash in self.quarantined
+
+    def record(self, pattern_hash, checksum, useful_words):
+        """
+        Records one fetch of a url with the given pattern.
+
+        :param checksum: fingerprint of the page content, None if the fetch returned nothing
+        :param useful_words: number of non stopword tokens on the page
+        Returns True if this fetch got the pattern quarantined.
+        """
+        with self.lock:
+            if pattern_hash in self.quarantined:
+                return False
+            stats = self.patterns.get(pattern_hash)
+            if stats is None:
+                stats = self.patterns[pattern_hash] = PatternStats()
+            stats.fetches += 1
+            stats.useful_words += useful_words
+            if checksum is not None:
+                stats.checksums.add(checksum)
+            if stats.fetches < self.min_fetches:
+                return False
+            if (stats.distinct_ratio() >= self.min_distinct_ratio
+                    and stats.avg_useful_words() >= self.min_avg_words):
+                return False
+            self.quarantined.add(pattern_hash)
+            del self.patterns[pattern_hash]
+        self.save()
+        return True
@@ -1,7 +1,82 @@
 import hashlib
 import re
+from functools import lru_cache
 from urllib.parse import urlparse, parse_qs
 
+# segment categories in order of precedence, the first full match wins.
+# segments are lowercased and stripped before they are matched.
+SEGMENT_RULES = [
+    ("UUID", r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[1-5][0-9a-fA-F]{3}-[89abAB][0-9a-fA-F]{3}-[0-9a-fA-F]{12}"),
+    ("DATE", r"\d{4}[-/]\d{2}[-/]\d{2}"),
+    ("INT", r"\d+"),
+    ("HEX", r"[0-9a-fA-F]{8,}"),
+    ("SLUG", r"[a-z0-9]+(?:-[a-z0-9]+)+"),
+]
+
+# common tracking query params
+DROP_QUERY_KEY_PATTERNS = [r"^utm_", r"^_g", r"session", r"^sid$"]
+
+HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+class UrlPatternClassifier(object):
+    """
+    Turns urls into url patterns (ids, dates, slugs... replaced by their
+    category) and hashes them.
+
+    The segment rules are compiled once into a single alternation regex and
+    segment -> category results are kept in a bounded LRU cache, since the
+    same path segments repeat across most of a site.
+    """
+    def __init__(self, segment_rules=SEGMENT_RULES, drop_query_key_patterns=DROP_QUERY_KEY_PATTERNS, cache_size=65536):
+        self.segment_rules = list(segment_rules)
+        self.drop_query_key_patterns = list(drop_query_key_patterns)
+        self.segment_re = re.compile(
+            "|".join(f"(?P<{name}>{pattern})" for name, pattern in self.segment_rules))
+        self.drop_query_key_re = re.compile(
+            "|".join(f"(?:{pattern})" for pattern in self.drop_query_key_patterns), re.IGNORECASE)
+        # only the default rules are known to need a digit, a '-' or a hex string
+        self.fast_path = self.segment_rules == SEGMENT_RULES
+        self.get_segment_category = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, seg):
+        seg = seg.lower().strip()
+        if self.fast_path and "-" not in seg and seg.isalpha() and not HEX_DIGITS.issuperset(seg):
+            # plain words are never an id, date, hex string or slug
+            return seg
+        # fullmatch backtracks into the next alternative, so the first rule
+        # that matches the whole segment wins, as with one regex per rule
+        match = self.segment_re.fullmatch(seg)
+        if match:
+            return match.lastgroup
+        return seg
+
+    def drop_control_query_params(self, query_dict):
+        """remove common tracking query params"""
+        return {
+            key: val
+            for key, val in query_dict.items()
+            if not self.drop_query_key_re.search(key.lower())
+        }
+
+    def get_url_pattern(self, url):
+        """convert url string to url pattern"""
+        domain, path, query_str_dict = get_url_parts(url)
+        category = self.get_segment_category
+
+        path_str = '/'.join(map(category, path.split('/')))
+        query_str_dict = self.drop_control_query_params(query_str_dict)
+        query_str = "&".join(
+            f"{key.lower()}={category(val)}" for key, val in sorted(query_str_dict.items()))
+        return f"{domain}{path_str}?{query_str}"
+
+    def get_url_pattern_hash(self, url):
+        return hash_url_pattern(self.get_url_pattern(url))
+
+
+default_classifier = UrlPatternClassifier()
+
+
 def get_url_parts(url):
     """Breaks url string into domain, path, query params"""
     parsed_url = urlparse(url)
@@ -15,84 +90,21 @@ def get_url_parts(url):
 
 def get_segment_category(seg):
     """detects segment's category and returns it, otherwise it returns the segment"""
-    seg = seg.lower().strip()
-    UUID_RE = re.compile(
-        r"^[0-9a-fA-F]{8}-"
-        r"[0-9a-fA-F]{4}-"
-        r"[1-5][0-9a-fA-F]{3}-"
-        r"[89abAB][0-9a-fA-F]{3}-"
-        r"[0-9a-fA-F]{12}$"
-    )
-
-    DATE_RE = re.compile(
-        r"^\d{4}[-/]\d{2}[-/]\d{2}$"
-    )
-
-    INT_RE = re.compile(r"^\d+$")
-
-    DASHED_SLUG_RE = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+)+$")
-
-    HEX_RE = re.compile(r"^[0-9a-fA-F]{8,}$")
-
-
-    if UUID_RE.match(seg):
-        return "UUID"
-
-    if DATE_RE.match(seg):
-        return "DATE"
-
-    if INT_RE.match(seg):
-        return "INT"
-
-    if HEX_RE.match(seg):
-        return "HEX"
+    return default_classifier.get_segment_category(seg)
 
-    if DASHED_SLUG_RE.match(seg):
-        return "SLUG"
-
-    return seg
 
 def drop_control_query_params(query_dict):
     """remove common tracking query params"""
-    DROP_QUERY_KEY_PATTERNS = [
-        re.compile(r"^utm_", re.IGNORECASE),
-        re.compile(r"^_g", re.IGNORECASE),
-        re.compile(r"session", re.IGNORECASE),
-        re.compile(r"^sid$", re.IGNORECASE),
-    ]
-    filtered_params = {
-        key: val
-        for key, val in query_dict.items()
-        if not any(p.search(key.lower()) for p in DROP_QUERY_KEY_PATTERNS)
-    }
-    return filtered_params
+    return default_classifier.drop_control_query_params(query_dict)
 
-    
 
 def hash_url_pattern(url_str):
     return hashlib.sha256(url_str.encode('utf-8')).hexdigest()
-    
-def get_url_pattern_hash(url):
-    """convert url string to url pattern """
-    domain, path, query_str_dict = get_url_parts(url)
-
-    path_list = map(get_segment_category,path.split('/'))
-    query_str_dict = drop_control_query_params(query_str_dict)
-    query_list = [f"{key.lower()}={get_segment_category(val)}" for key, val in sorted(query_str_dict.items())]
- 
-    path_str = '/'.join(path_list)
-    query_str = "&".join(query_list) 
-    url_pattern = f"{domain}{path_str}?{query_str}"
-    return hash_url_pattern(url_pattern)
-    
-def hash_url_pattern(url_str):
-    return hashlib.sha256(url_str.encode('utf-8')).hexdigest()
-
-
 
 
-        
-
+def get_url_pattern_hash(url):
+    """convert url string to url pattern hash"""
+    return default_classifier.get_url_pattern_hash(url)
 
 
 if __name__=="__main__":
@@ -100,4 +112,4 @@ if __name__=="__main__":
     get_url_pattern_hash("https://ics.uci.edu/event/master-of-computer-science-information-session-02-09-26/")
     get_url_pattern_hash("https://uci.zoom.us/meeting/register/l39e8nu_Qy-CT5pi0VeL_g#/registration")
     get_url_pattern_hash("https://edstem.org/us/courses/90198/discussion/7629727")
-    get_url_pattern_hash("https://mail.google.com/mail/u/0/#inbox")
\ No newline at end of file
+    get_url_pattern_hash("https://mail.google.com/mail/u/0/#inbox")